@@ -51,6 +51,7 @@ if __name__ == "__main__":
         version="1.1.5",
         package_dir={"": "src"},
         packages=find_packages("src"),
+        python_requires=">=3.6",
         install_requires=["parse==1.6.6", "yapsy==1.11.223", "pydbus==0.6.0"],
         entry_points={
             'console_scripts': [
@@ -1,14 +1,27 @@
 import weresync.daemon.device as device
 import weresync.utils as utils
 from weresync.exception import (CopyError, DeviceError, UnsupportedDeviceError)
-import random
 import os
+import sys
+import tempfile
+import time
 import logging
 import subprocess
 from pydbus.generic import signal
 
 LOGGER = logging.getLogger(__name__)
 
+LVM_CACHE_TTL = 5
+"""The number of seconds the result of a ``pvs`` scan is reused for."""
+
+_lvm_cache = {"time": 0, "pvs": None}
+
+_LOSETUP_DETACH = ["losetup", "-d"]
+
+_LVM_CODES = frozenset(("8e00", "8e"))
+"""Partition codes marking an LVM partition. The two versions appear in gdisk
+and fdisk, respectively."""
+
 
 def mount_loop_device(image_file):
     """Mounts an image file as a loop device and returns the device name of
@@ -19,25 +32,44 @@ def mount_loop_device(image_file):
     :returns: A string containing device identifier (/dev/sda or such)"""
 
     image_file = os.path.abspath(os.path.expanduser(image_file))
-    free_proc = subprocess.Popen(
-        ["losetup", "-f"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    free_output, free_error = free_proc.communicate()
-    if free_proc.returncode != 0:
-        raise DeviceError(image_file, "Error finding free loop device.",
-                          str(free_output, "utf-8"))
-
-    device_name = str(free_output, "utf-8").strip()
-    mount_proc = subprocess.Popen(
-        ["losetup", device_name, image_file],
+    # --show prints the loop device chosen by --find, and --partscan makes
+    # the kernel read its partition table, so no partprobe is needed.
+    mount_proc = subprocess.run(
+        ["losetup", "--find", "--show", "--partscan",
+         os.fsencode(image_file)],
         stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT)
-    mount_output, mount_error = mount_proc.communicate()
+        stderr=subprocess.PIPE)
     if mount_proc.returncode != 0:
-        raise DeviceError(image_file,
-                          "Error mounting image on {0}".format(device_name),
-                          str(mount_output, "utf-8"))
-    subprocess.call(["partprobe", device_name])
-    return device_name
+        raise DeviceError(image_file, "Error mounting image on loop device.",
+                          str(mount_proc.stderr, "utf-8"))
+    # Loop device names are always plain ASCII
+    return mount_proc.stdout.decode("ascii", "replace").strip()
+
+
+def _get_volume_group_pvs():
+    """Returns a dictionary mapping the name of each volume group to a list of
+    its physical volumes. Physical volumes not in a group are listed under "".
+
+    The whole LVM topology is read with a single ``pvs`` scan, and the result
+    is reused for :py:data:`LVM_CACHE_TTL` seconds.
+
+    :raises DeviceError: if ``pvs`` returns a non-zero exit code."""
+    now = time.monotonic()
+    if (_lvm_cache["pvs"] is None
+            or now - _lvm_cache["time"] > LVM_CACHE_TTL):
+        output = utils.run_proc(
+            ["pvs", "--noheadings", "--separator", ":", "-o",
+             "vg_name,pv_name"], "", "Error finding physical volumes for LVM.")
+        vg_pvs = {}
+        for line in output.split("\n"):
+            line = line.strip()
+            if line == "":
+                continue
+            vg_name, pv_name = line.split(":", 1)
+            vg_pvs.setdefault(vg_name, []).append(pv_name)
+        _lvm_cache["pvs"] = vg_pvs
+        _lvm_cache["time"] = now
+    return _lvm_cache["pvs"]
 
 
 def create_new_vg_if_not_exists(lvm, name, target):
@@ -52,34 +84,26 @@ def create_new_vg_if_not_exists(lvm, name, target):
     :param target: a :py:class:`~weresync.device.DeviceManager` representing
                    the device whose partitions to add to the LVM."""
     lvm_partitions = []
-    for i in target.get_partitions():
-        code = target.get_partition_code(i).lower()
-        if code == "8e00" or code == "8e":
-            # the two versions appear in gdisk and fdisk, respectively
+    for i, code in target.get_partition_codes().items():
+        if code.lower() in _LVM_CODES:
             lvm_partitions.append(i)
 
-    lvm_part_block = [
-        target.part_mask.format(target.device, x) for x in lvm_partitions
-    ]
-    lvm_test = subprocess.Popen(
-        ["vgs", name], stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-    output, _ = lvm_test.communicate()
-    if lvm_test.returncode == 5:
-        # If the VG does not exist, the return code is 5
+    part_format = target.part_mask.format
+    lvm_part_block = [part_format(target.device, x) for x in lvm_partitions]
+    vg_name = name[5:] if name.startswith("/dev/") else name
+    vg_pvs = _get_volume_group_pvs()
+    if vg_name not in vg_pvs:
         utils.run_proc(["vgcreate", name] + lvm_part_block, target.device,
                        "Error creating logical volume group.")
+        _lvm_cache["pvs"] = None
     else:
-        if name.startswith("/dev/"):
-            name = name[5:]
-        result = utils.run_proc(
-            ["pvs", "-S", "vg_name=" + name, "--noheadings", "-o", "pv_name"],
-            name, "Error finding physical volumes for LVM.")
-        LOGGER.debug("PVs in LVM: " + result)
-        results = [x.strip() for x in result.split("\n")]
-        lvm_part_block = [x for x in lvm_part_block if x not in results]
+        LOGGER.debug("PVs in LVM: " + str(vg_pvs[vg_name]))
+        existing_pvs = set(vg_pvs[vg_name])
+        lvm_part_block = [x for x in lvm_part_block if x not in existing_pvs]
         if len(lvm_part_block) > 0:
-            utils.run_proc(["vgextend", name] + lvm_part_block, name,
+            utils.run_proc(["vgextend", vg_name] + lvm_part_block, vg_name,
                            "Error adding PVs to LVM")
+            _lvm_cache["pvs"] = None
 
 
 def copy_partitions(copier, part_callback=None, lvm=False):
@@ -178,7 +202,7 @@ class DriveCopier(object):
                   check_if_valid_and_copy=False,
                   source_part_mask="{0}{1}",
                   target_part_mask="{0}{1}",
-                  excluded_partitions=[],
+                  excluded_partitions=frozenset(),
                   ignore_copy_failures=True,
                   root_partition=-1,
                   boot_partition=-1,
@@ -231,8 +255,8 @@ class DriveCopier(object):
         :param mount_points: Expects a tuple containing two strings pointing to
                              the directories where partitions should be mounted in
                              case of testing. If None, the function will generate
-                             two random directories in the /tmp folder. Defaults
-                             to None.
+                             two temporary directories in the /tmp folder.
+                             Defaults to None.
         :param lvm: the Logical Volume Group to copy to the new drive.
 
         :raises DeviceError: If there is an error reading data from one device or
@@ -256,9 +280,12 @@ class DriveCopier(object):
         root_partition = root_partition if root_partition >= 0 else None
         boot_partition = boot_partition if boot_partition >= 0 else None
         efi_partition = efi_partition if efi_partition >= 0 else None
+        # Every partition is checked against this, so make lookups O(1)
+        excluded_partitions = frozenset(excluded_partitions)
 
         try:
             source_loop = None
+            temp_dirs = []
             target_loop = None
             if source.endswith(".img"):
                 source_loop = mount_loop_device(source)
@@ -282,9 +309,15 @@ class DriveCopier(object):
             except (DeviceError, UnsupportedDeviceError) as ex:
                 # Since we're erasing the target drive anyway, we can just create
                 # a new disk label
-                proc = subprocess.Popen(
-                    ["sgdisk", "-o", target_manager.device])
-                proc.communicate()
+                proc = subprocess.run(
+                    ["sgdisk", "-o", target_manager.device],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT)
+                if proc.returncode != 0:
+                    LOGGER.warning("Error creating new disk label on "
+                                   + target_manager.device)
+                    LOGGER.debug("sgdisk output:\n"
+                                 + str(proc.stdout, "utf-8"))
 
             copier = device.DeviceCopier(source_manager, target_manager)
             partitions_remade = False
@@ -305,10 +338,9 @@ class DriveCopier(object):
 
             if mount_points is ("", "") or len(
                     mount_points) < 2 or mount_points[0] == mount_points[1]:
-                source_dir = "/tmp/" + str(random.randint(0, 100000))
-                target_dir = "/tmp/" + str(random.randint(-100000, -1))
-                os.makedirs(source_dir, exist_ok=True)
-                os.makedirs(target_dir, exist_ok=True)
+                source_dir = tempfile.mkdtemp(prefix="weresync-source-")
+                target_dir = tempfile.mkdtemp(prefix="weresync-target-")
+                temp_dirs = [source_dir, target_dir]
                 mount_points = (source_dir, target_dir)
 
             print(_("Beginning to copy files."))
@@ -337,9 +369,19 @@ class DriveCopier(object):
         finally:
 
             def delete_loop(loop_name):
-                subprocess.call(["losetup", "-d", loop_name])
+                subprocess.call(_LOSETUP_DETACH + [loop_name],
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
 
             if source_loop is not None:
                 delete_loop(source_loop)
             if target_loop is not None:
                 delete_loop(target_loop)
+            for temp_dir in temp_dirs:
+                # os.rmdir only removes empty folders, so nothing is deleted
+                # if a partition was somehow left mounted.
+                try:
+                    os.rmdir(temp_dir)
+                except OSError:
+                    LOGGER.debug("Could not remove " + temp_dir,
+                                 exc_info=sys.exc_info())
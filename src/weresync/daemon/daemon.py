@@ -22,6 +22,7 @@ from gi.repository import GLib
 from pydbus import SystemBus
 import weresync.utils as utils
 import logging
+import signal
 
 DEFAULT_DAEMON_LOG_LOCATION = "/var/log/weresync/weresync.log"
 
@@ -37,6 +38,10 @@ def run():
         with bus.publish("net.manilas.weresync.DriveCopier", DriveCopier()):
             GLib.idle_add(lambda: LOGGER.debug("Starting GLib loop"))
             loop = GLib.MainLoop()
+            # Stopping the loop on SIGTERM lets the daemon exit normally, so
+            # buffered log records are written out when systemd stops it.
+            GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM,
+                                 loop.quit)
             loop.run()
 
 
@@ -26,6 +26,8 @@ import glob
 import parse
 import re
 import tempfile
+import time
+import functools
 
 MOUNT_POINT = "/mnt"
 
@@ -42,6 +44,37 @@ DEFAULT_RSYNC_ARGS = "-aAXxH --delete"
 """Default arguments passed to rsync. See rsync documentation for what they
 do."""
 
+RSYNC_PROGRESS_REGEX = re.compile(rb"\s(\d+)%\s")
+"""Matches the percent complete in a line of rsync's --info=progress2
+output."""
+RSYNC_LINE_END_REGEX = re.compile(rb"[\r\n]")
+"""Splits rsync's output into lines. rsync ends progress updates with a
+carriage return, so the same line can be redrawn, and other lines with a
+newline."""
+PROGRESS_CALLBACK_INTERVAL = 0.1
+"""The minimum number of seconds between two copy progress callbacks for the
+same partition."""
+FINDMNT_ESCAPE_REGEX = re.compile(rb"\\x([0-9a-fA-F]{2})")
+"""Matches the escaped bytes in findmnt's raw output."""
+
+
+@functools.lru_cache(maxsize=32)
+def _replacement_regex(substrs):
+    """Compiles the regex used by :py:func:`multireplace`. It is cached since
+    the same uuid map is applied to every file of a partition.
+
+    :param tuple substrs: the strings to match, in any fixed order. They may
+                          be str or bytes, but all of the same type."""
+    # Place longer ones first to keep shorter substrings from matching where
+    # the longer ones should take place
+    # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against
+    # the string 'hey abc', it should produce
+    # 'hey ABC' and not 'hey ABc'
+    # Create a big OR regex that matches any of the substrings to replace
+    separator = "|" if isinstance(substrs[0], str) else b"|"
+    return re.compile(separator.join(
+        map(re.escape, sorted(substrs, key=len, reverse=True))))
+
 
 def multireplace(string, replacements):
     """
@@ -50,19 +83,14 @@ def multireplace(string, replacements):
     `Credit goes to bgusach
     <https://gist.github.com/bgusach/a967e0587d6e01e889fd1d776c5f3729>`_
 
-    :param str string: string to execute replacements on
+    :param string: string to execute replacements on. May also be bytes, in
+                   which case the replacement dictionary must hold bytes too.
     :param dict replacements: replacement dictionary
                               {value to find: value to replace}
     :returns: a string with the replaced text."""
-    # Place longer ones first to keep shorter substrings from matching where
-    # the longer ones should take place
-    # For instance given the replacements {'ab': 'AB', 'abc': 'ABC'} against
-    # the string 'hey abc', it should produce
-    # 'hey ABC' and not 'hey ABc'
-    substrs = sorted(replacements, key=len, reverse=True)
-
-    # Create a big OR regex that matches any of the substrings to replace
-    regexp = re.compile('|'.join(map(re.escape, substrs)))
+    if not replacements:
+        return string
+    regexp = _replacement_regex(tuple(sorted(replacements)))
 
     # For each match, look up the new string in the replacements
     return regexp.sub(lambda match: replacements[match.group(0)], string)
@@ -92,6 +120,12 @@ class DeviceManager:
                                "{0}{1}"."""
         self.device = device
         self.part_mask = partition_mask
+        self._table_type = None
+
+    def refresh(self):
+        """Forgets what is cached about the device. Must be called after the
+        partition table of the device is replaced."""
+        self._table_type = None
 
     def get_partitions(self):
         """Returns a list with all the partitions in the drive. The partitions
@@ -151,6 +185,44 @@ class DeviceManager:
         else:
             return None
 
+    def mount_points(self, partitions):
+        """Finds the mountpoints of several partitions with a single call to
+        findmnt. See :py:func:`~.DeviceManager.mount_point`.
+
+        :param partitions: the numbers of the partitions whose mounts to find.
+        :returns: a dictionary from partition number to mountpoint. Partitions
+                  which are not mounted are left out."""
+        # findmnt lists the device a symlink like /dev/vg/lv points to, so
+        # both sides are compared by their real path
+        devices = {
+            os.path.realpath(self.part_mask.format(self.device, i)): i
+            for i in partitions
+        }
+        findprocess = subprocess.Popen(
+            ["findmnt", "-rn", "-o", "SOURCE,TARGET"],
+            stdout=subprocess.PIPE)
+        output, error = findprocess.communicate()
+        exit_code = findprocess.returncode
+        if exit_code != 0 and exit_code != 1:
+            raise weresync.exception.DeviceError(self.device,
+                                                 "Non-zero exit code",
+                                                 str(output, "utf-8"))
+
+        mounts = {}
+        for line in output.split(b"\n"):
+            words = line.split()
+            if len(words) < 2:
+                continue
+            # Raw output escapes spaces and other special characters as \xNN
+            source, target = (str(FINDMNT_ESCAPE_REGEX.sub(
+                lambda match: bytes((int(match.group(1), 16),)), word),
+                "utf-8") for word in words[:2])
+            # Subvolume mounts look like /dev/sda1[/subvol]
+            part = devices.get(os.path.realpath(source.split("[")[0]))
+            if part is not None and part not in mounts:
+                mounts[part] = target
+        return mounts
+
     def mount_partition(self, partition_num, mount_loc):
         """Mounts the specified partition at the specified location.
 
@@ -232,10 +304,15 @@ class DeviceManager:
         """Gets the type of partition table on the device. Usually "gpt" for
         GPT disks or "msdos" for MBR disks.
 
+        The result is cached until :py:func:`~.DeviceManager.refresh` is
+        called.
+
         :returns: A string containing the name of the partition table.
         :raises DeviceError: If the parted command has a non-zero return code.
         :raises UnsupportedDeviceError: If the device does not have a
                                         supported partition type."""
+        if self._table_type is not None:
+            return self._table_type
 
         process = subprocess.Popen(
             ["partprobe", "-s", "-d", self.device], stdout=subprocess.PIPE)
@@ -248,6 +325,7 @@ class DeviceManager:
         result = str(output, "utf-8")
         for table_type in SUPPORTED_PARTITION_TABLE_TYPES:
             if table_type in result:
+                self._table_type = table_type
                 return table_type
         else:
             raise weresync.exception.UnsupportedDeviceError(
@@ -392,7 +470,23 @@ class DeviceManager:
                             exist) is passed.
         :returns: a string containing the partition code for the appropriate
                   disk type."""
+        codes = self.get_partition_codes()
+        try:
+            return codes[int(partition_num)]
+        except KeyError:
+            raise ValueError("Invalid partition number, no partition found.")
+
+    def get_partition_codes(self):
+        """Gets the partition codes of every partition on the device with a
+        single call to sgdisk (GPT) or fdisk (MBR). See
+        :py:func:`~.DeviceManager.get_partition_code`.
+
+        :raises DeviceError: If the command returns a non-zero return code.
+        :raises ValueError: If the fdisk output is in an unsupported format.
+        :returns: a dictionary mapping each partition number to its partition
+                  code."""
         table_type = self.get_partition_table_type()
+        codes = {}
         if table_type == "gpt":
             proc = subprocess.Popen(
                 ["sgdisk", self.device, "-p"],
@@ -405,12 +499,12 @@ class DeviceManager:
                     "Error getting device information from sgdisk",
                     str(output, "utf-8"))
             for line in str(output, "utf-8").split("\n"):
-                if line.strip().startswith(str(partition_num)):
-                    words = line.strip().split()
-                    return words[
-                        5]  # The code appears in the fifth column, but the
-                # size takes up two columns (one for value and one for unit),
-                # so the code appears in the sixth column.
+                words = line.split()
+                if len(words) > 5 and words[0].isdigit():
+                    # The code appears in the fifth column, but the size takes
+                    # up two columns (one for value and one for unit), so the
+                    # code appears in the sixth column.
+                    codes[int(words[0])] = words[5]
         elif table_type == "msdos":
             proc = subprocess.Popen(
                 ["fdisk", self.device, "-l"],
@@ -433,20 +527,24 @@ class DeviceManager:
             else:
                 raise ValueError("Unsupported fdisk format.")
 
-            part_name = self.part_mask.format(self.device, partition_num)
+            part_prefix = self.part_mask.format(self.device, "")
+            part_parser = parse.compile(
+                self.part_mask.format(self.device, "{0}"))
             for line in lines:
-                if line.strip().startswith(part_name):
-                    words = line.strip().split()
-                    loc = code_index  # the code is in the 5th column
-                    if "*" not in line:
-                        loc -= 1
-                        # if the partition is not bootable the column for the
-                        # boot header is not seperated.
-
-                    return words[loc]
-
-            # No partition found
-            raise ValueError("Invalid partition number, no partition found.")
+                line = line.strip()
+                if not line.startswith(part_prefix):
+                    continue
+                words = line.split()
+                part = part_parser.parse(words[0])
+                if part is None:
+                    continue
+                loc = code_index  # the code is in the 5th column
+                if "*" not in line:
+                    loc -= 1
+                    # if the partition is not bootable the column for the
+                    # boot header is not seperated.
+                codes[int(part[0])] = words[loc]
+        return codes
 
     def get_partition_alignment(self):
         """Returns the number of sectors the drive must be aligned to. For GPT
@@ -743,6 +841,14 @@ class LVMDeviceManager(DeviceManager):
         raise weresync.exception.UnsupportedDeviceError(
             "Partition codes not applicable to lvm drives.")
 
+    def get_partition_codes(self):
+        """Not valid for LVM drives.
+
+        :raises UnsupportedDeviceError:"""
+
+        raise weresync.exception.UnsupportedDeviceError(
+            "Partition codes not applicable to lvm drives.")
+
     def _get_general_info(self, partition_num):
         """Same method as the _get_general_info method for the main
         DeviceManager class."""
@@ -894,6 +1000,9 @@ class DeviceCopier:
         :param difference: the difference between the sizes of the two drives
         :param margin: the amount of margin to give shrunk partitions."""
         partitions = self.source.get_partitions()
+        # Read every partition code with one sgdisk call, rather than one per
+        # partition.
+        codes = self.source.get_partition_codes()
         part_alignment = self.target.get_partition_alignment()
         add_args = []
         type_args = []
@@ -943,7 +1052,7 @@ class DeviceCopier:
                 add_args = ["-n", "{0}:0:0".format(i)] + add_args
 
             type_args += [
-                "-t", "{0}:{1}".format(i, self.source.get_partition_code(i))
+                "-t", "{0}:{1}".format(i, codes[i])
             ]
 
         LOGGER.debug(["sgdisk", self.target.device, "-o"] + add_args +
@@ -1000,16 +1109,15 @@ class DeviceCopier:
             if x.startswith(
                 self.source.part_mask.format(self.source.device, ""))
         ]
+        part_parser = parse.compile(
+            self.source.part_mask.format(self.source.device, "{0}"))
         for idx, val in enumerate(partition_listings):
             # Standard line of sfdisk -d output:
             # mbr.img1:start=2050,size=1893,Id=83, bootable
             # a new version would have "type" instead of "Id"
             listing = val.split(":")
             pairs = {
-                "part": int(
-                    parse.parse(
-                        self.source.part_mask.format(self.source.device,
-                                                     "{0}"), listing[0])[0])
+                "part": int(part_parser.parse(listing[0])[0])
             }
             for i in listing[1].split(","):
                 pair = i.split("=")
@@ -1232,6 +1340,7 @@ class DeviceCopier:
             self._transfer_gpt(source_size - target_size)
         elif source_type == "msdos":
             self._transfer_msdos(source_size - target_size)
+        self.target.refresh()
 
         for i in self.target.get_partitions():
             if self.target.mount_point(i) is not None:
@@ -1483,6 +1592,84 @@ class DeviceCopier:
                 if target_mounted:
                     source_manager.unmount_partition(i)
 
+    def _copy_partition(self, source_manager, target_manager, partition,
+                        mnt_source, mnt_target, rsync_command, callback):
+        """Copies the files of a single partition with rsync, mounting the
+        source and target partitions if they are not already mounted. See the
+        main `copy_files` method for documentation of the arguments.
+
+        :param rsync_command: the rsync argument list, without the source and
+                              target folders."""
+        i = partition
+        source_mounted = False
+        target_mounted = False
+        try:
+            source_loc = source_manager.mount_point(i)
+            if source_loc is None:
+                source_manager.mount_partition(i, mnt_source)
+                source_mounted = True
+                source_loc = mnt_source
+            target_loc = target_manager.mount_point(i)
+            if target_loc is None:
+                target_manager.mount_partition(i, mnt_target)
+                target_mounted = True
+                target_loc = mnt_target
+
+            LOGGER.info("Starting rsync process for partition {0}.".format(
+                source_manager.device))
+            command_args = rsync_command + [
+                source_loc +
+                ("/" if not source_loc.endswith("/") else ""), target_loc
+            ]
+            print("Copying partition " + str(i))
+            LOGGER.debug("Arguments = " + " ".join(command_args))
+
+            def run_proc():
+                with subprocess.Popen(
+                        command_args,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE) as proc:
+                    # rsync ends progress lines with \r, so the output is
+                    # read in chunks and split on both line endings.
+                    buf = b""
+                    while True:
+                        chunk = proc.stdout.read1(4096)
+                        if chunk == b"":
+                            break
+                        lines = RSYNC_LINE_END_REGEX.split(buf + chunk)
+                        buf = lines.pop()
+                        yield from lines
+                    if buf != b"":
+                        yield buf
+
+                    LOGGER.debug("Errors for partition {0}:\n".format(i) +
+                                 proc.stderr.read().decode())
+
+            if callback is not None:
+                last_callback = 0
+                for line in run_proc():
+                    match = RSYNC_PROGRESS_REGEX.search(line)
+                    if match is None:
+                        continue
+                    now = time.monotonic()
+                    if now - last_callback < PROGRESS_CALLBACK_INTERVAL:
+                        continue
+                    last_callback = now
+                    callback(i, int(match.group(1)) / 100)
+
+                LOGGER.debug("Setting to finished")
+                callback(i, 1.0)
+            else:
+                for val in run_proc():
+                    # If you don't loop through the generator values, the
+                    # rsync process doesn't run properly.
+                    pass
+        finally:
+            if source_mounted:
+                source_manager.unmount_partition(i)
+            if target_mounted:
+                target_manager.unmount_partition(i)
+
     def _copy_files(self,
                     mnt_source,
                     mnt_target,
@@ -1492,86 +1679,37 @@ class DeviceCopier:
                     callback,
                     lvm=False):
         """This is an internal method used for copying files. See the
-        main `copy_files` method for documentation."""
+        main `copy_files` method for documentation.
+
+        Partitions are copied one at a time. Every partition of a drive is
+        mounted on the same two folders and they all share the same source
+        and target disks, so running several rsync processes at once would
+        only make the disks seek between them."""
         if lvm:
             source_manager = self.lvm_source
             target_manager = self.lvm_target
         else:
             source_manager = self.source
             target_manager = self.target
+        # Every partition is copied to a different target filesystem, so each
+        # needs its own rsync process. The arguments they share are only
+        # built once.
+        rsync_command = ["rsync"] + shlex.split(rsync_args) + [
+            '--exclude=' + x + ''
+            for x in [
+                "/dev/*", "/proc/*", "/sys/*", "/tmp/*", "/run/*",
+                "/mnt/*", "/media/*", "/lost+found", "/home/*/.gvfs"
+            ]
+        ]
+        if callback is not None:
+            rsync_command += ["--info=progress2", "--outbuf=L"]
         for i in source_manager.get_partitions():
-            source_mounted = False
-            target_mounted = False
+            if i in excluded_partitions:
+                continue
             try:
-
-                if i in excluded_partitions:
-                    continue
-
-                source_loc = source_manager.mount_point(i)
-                if source_loc is None:
-                    source_manager.mount_partition(i, mnt_source)
-                    source_mounted = True
-                    source_loc = mnt_source
-                target_loc = target_manager.mount_point(i)
-                if target_loc is None:
-                    target_manager.mount_partition(i, mnt_target)
-                    target_mounted = True
-                    target_loc = mnt_target
-
-                LOGGER.info("Starting rsync process for partition {0}.".format(
-                    source_manager.device))
-                command_args = ["rsync"] + shlex.split(rsync_args) + [
-                    '--exclude=' + x + ''
-                    for x in [
-                        "/dev/*", "/proc/*", "/sys/*", "/tmp/*", "/run/*",
-                        "/mnt/*", "/media/*", "/lost+found", "/home/*/.gvfs"
-                    ]
-                ] + [
-                    source_loc +
-                    ("/" if not source_loc.endswith("/") else ""), target_loc
-                ]
-                if callback is not None:
-                    command_args += ["--info=progress2"]
-                print("Copying partition " + str(i))
-                LOGGER.debug("Arguments = " + " ".join(command_args))
-
-                def run_proc():
-                    with subprocess.Popen(
-                            command_args,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE) as proc:
-                        buf = bytearray()
-                        while True:
-                            byt = proc.stdout.read(1)
-                            if byt == b"":
-                                break
-                            elif byt == b"\r":
-                                yield buf.decode()
-                                buf = bytearray()
-                            else:
-                                buf += byt
-
-                        LOGGER.debug("Errors for partition {0}:\n".format(i) +
-                                     proc.stderr.read().decode())
-
-                if callback is not None:
-                    for val in run_proc():
-                        vals = val.split()
-                        if len(vals) >= 2 and vals[1].endswith("%"):
-                            try:
-                                float_val = float(vals[1].strip("%")) / 100
-                            except ValueError:
-                                continue
-                            callback(i, float_val)
-
-                    LOGGER.debug("Setting to finished")
-                    callback(i, 1.0)
-                else:
-                    for val in run_proc():
-                        # If you don't loop through the generator values, the
-                        # rsync process doesn't run properly.
-                        pass
-
+                self._copy_partition(source_manager, target_manager, i,
+                                     mnt_source, mnt_target, rsync_command,
+                                     callback)
             except weresync.exception.DeviceError as exe:
                 if ignore_failures:
                     LOGGER.warning(
@@ -1583,11 +1721,6 @@ class DeviceCopier:
                         callback(i, -1.0)
                 else:
                     raise exe
-            finally:
-                if source_mounted:
-                    source_manager.unmount_partition(i)
-                if target_mounted:
-                    target_manager.unmount_partition(i)
         print(_("Finished copying files."))
 
     def copy_files(self,
@@ -1662,9 +1795,8 @@ class DeviceCopier:
             if plugin_name is not None:
                 import weresync.plugins as plugins
                 manager = plugins.get_manager()
-                manager.collectPlugins()
                 full_name = "weresync_" + plugin_name
-                pluginInfo = manager.getPluginByName(full_name, "bootloader")
+                pluginInfo = plugins.get_plugin_for_name(full_name)
                 if pluginInfo is None:
                     raise PluginNotFoundError("No such plugin {0}".format(
                         full_name))
@@ -15,19 +15,30 @@
 """This modules has easy, one function interfaces with the DeviceCopier and
 DeviceManager."""
 
-import weresync.daemon.device as device
-from weresync.exception import InvalidVersionError
 import weresync.interface.dbus_client as dbus_client
 import logging
-import logging.handlers
 import sys
-import argparse
+import time
+import functools
 import weresync.utils as utils
 
 LOGGER = logging.getLogger(__name__)
 
 DEFAULT_LENGTH = 60
 
+DEFAULT_FILL = '█'
+
+PROGRESS_REDRAW_INTERVAL = 0.05
+"""Minimum number of seconds between two redraws of a progress bar whose
+filled length has not changed."""
+
+_BAR_CACHE = [DEFAULT_FILL * i + '-' * (DEFAULT_LENGTH - i)
+              for i in range(DEFAULT_LENGTH + 1)]
+
+_last_emit = {}
+"""Maps a progress bar prefix to the time and filled length it was last
+drawn with, so each bar is throttled separately."""
+
 partition_copying_completed = False
 
 
@@ -37,7 +48,7 @@ def _print_progress_bar(iteration,
                         suffix='',
                         decimals=1,
                         length=DEFAULT_LENGTH,
-                        fill='█'):
+                        fill=DEFAULT_FILL):
     """
     Call in a loop to create terminal progress bar
 
@@ -53,27 +64,180 @@ def _print_progress_bar(iteration,
         fill        - Optional  : bar fill character (Str)
     """
     # the first part of the above tuple is the terminal width
+    filledLength = int(length * iteration // total)
+    now = time.monotonic()
+    last_time, last_filled = _last_emit.get(prefix, (0, None))
+    if (iteration != total and filledLength == last_filled
+            and now - last_time < PROGRESS_REDRAW_INTERVAL):
+        return
+    _last_emit[prefix] = (now, filledLength)
     percent = ("{0:." + str(decimals) + "f}").format(
         100 * (iteration / float(total)))
-    filledLength = int(length * iteration // total)
-    bar = fill * filledLength + '-' * (length - filledLength)
-    print('\r%s |%s| %s%% %s' % (prefix, bar, percent, suffix), end='\r')
+    if length == DEFAULT_LENGTH and fill == DEFAULT_FILL:
+        bar = _BAR_CACHE[filledLength]
+    else:
+        bar = fill * filledLength + '-' * (length - filledLength)
+    sys.stdout.write('\r%s |%s| %s%% %s\r' % (prefix, bar, percent, suffix))
+    sys.stdout.flush()
     # Print New Line on Complete
     if iteration == total:
         print()
 
 
+def _partition_list(text):
+    """Parses a comma separated list of partition numbers, as passed to
+    --excluded-partitions. Blank entries are skipped and duplicates removed.
+
+    :param text: the string passed on the command line.
+    :returns: a sorted list of unique partition numbers."""
+    try:
+        return sorted({int(x) for x in text.split(",") if x.strip()})
+    except ValueError:
+        import argparse
+        raise argparse.ArgumentTypeError(
+            _("Excluded partitions must be a comma separated list of "
+              "partition numbers."))
+
+
+def _get_plugin_epilog():
+    """Returns the help epilog listing the bootloader plugins found."""
+    import weresync.plugins as plugins
+    manager = plugins.collect_plugins()
+    pluginNames = []
+    for pluginInfo in manager.getAllPlugins():
+        pluginNames.append(pluginInfo.plugin_object.name)
+    return _("Bootloader plugins found: ") + ", ".join(pluginNames)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_parser():
+    """Builds the argument parser for :py:func:`main`. The parser is only
+    built once, so repeated calls to :py:func:`main` reuse it.
+
+    Translation must be enabled before the first call."""
+    import argparse
+    import weresync.daemon.device as device
+
+    class _Parser(argparse.ArgumentParser):
+        def format_help(self):
+            # Plugins are only searched for when help is actually shown.
+            if self.epilog is None:
+                self.epilog = _get_plugin_epilog()
+            return super().format_help()
+
+    parser = _Parser()
+    parser.add_argument(
+        "source",
+        help=_("The drive to copy data from. This drive will not be"
+               " edited."))
+    parser.add_argument(
+        "target",
+        help=_("The drive to copy data to. ALL DATA ON THIS DRIVE WILL BE "
+               "ERASED."))
+    parser.add_argument(
+        "-C",
+        "--check-and-partition",
+        action="store_true",
+        help=_("Check if partitions are valid and re-partition drive to "
+               "proper partitions if they are not."))
+    parser.add_argument(
+        "-s",
+        "--source-mask",
+        help=_("A string of format '{0}{1}' where {0} represents drive "
+               "identifier and {1} represents partition number to point "
+               "to partition block files for the source drive."))
+    parser.add_argument(
+        "-t",
+        "--target-mask",
+        help=_("A string of format '{0}{1}' where {0} represents drive "
+               "identifier and {1} represents partition number to point "
+               "to partition block files for the target drive."))
+    parser.add_argument(
+        "-e",
+        "--excluded-partitions",
+        type=_partition_list,
+        default=[],
+        help=_("A comment separated list of partitions of the source "
+               "drive to apply no actions on.perated list of partitions "
+               "of the source drive to apply no actions on."))
+    parser.add_argument(
+        "-b",
+        "--break-on-error",
+        action="store_false",
+        help=_("Causes program to break whenever a partition cannot be "
+               "copied, including uncopyable partitions such as swap"
+               " files. Not recommended."))
+    parser.add_argument(
+        "-g",
+        "--root-partition",
+        type=int,
+        help=_("The partition mounted on /."),
+        default=-1)
+    parser.add_argument(
+        "-B",
+        "--boot-partition",
+        type=int,
+        help=_("Partition which should be mounted on /boot"),
+        default=-1)
+    parser.add_argument(
+        "-E",
+        "--efi-partition",
+        type=int,
+        help=_("Partition which should be mounted on /boot/efi"),
+        default=-1)
+    parser.add_argument(
+        "-m",
+        "--source-mount",
+        help=_("Folder where partitions from the source drive should be "
+               "mounted."),
+        default="")
+    parser.add_argument(
+        "-M",
+        "--target-mount",
+        help=_("Folder where partitions from source drive should be"
+               " mounted."),
+        default="")
+    parser.add_argument(
+        "-r",
+        "--rsync-args",
+        help=_("List of arguments passed to rsync. Defaults to: ") +
+        device.DEFAULT_RSYNC_ARGS,
+        default=device.DEFAULT_RSYNC_ARGS)
+    parser.add_argument(
+        "-L",
+        "--bootloader",
+        help=_("Passed to decide what boootloader plugin to use. See "
+               "below for list of plugins. Defaults to simply changing "
+               "the UUIDs of files in /boot."),
+        default="uuid_copy")
+    parser.add_argument(
+        "-l",
+        "--lvm",
+        help=_("The name of the source logical volume."),
+        nargs="+")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "-v",
+        "--verbose",
+        help=_("Prints expanded output."),
+        action="store_const",
+        dest="loglevel",
+        const=logging.INFO)
+    group.add_argument(
+        "-d",
+        "--debug",
+        help=_("Prints large output. Mainly helpful for developers."),
+        action="store_const",
+        dest="loglevel",
+        const=logging.DEBUG)
+    return parser
+
+
 def main():
     """The entry point for the command line function. This uses argparse to
     parse arguments to call call :py:func:`.copy_drive` with. For help use
     "weresync -h" in a commandline after installation."""
 
-    if not dbus_client.copy_drive:
-        LOGGER.error("Failed to connect to dbus service. Is it running?")
-        LOGGER.log(logging.DEBUG, "DBus Connection error:",
-                   dbus_client.error)
-        return
-
     def part_callback(status):
         global partition_copying_completed
         if not partition_copying_completed:
@@ -100,129 +264,20 @@ def main():
         # incomplete installation so only test if True
 
     utils.enable_localization()
-    dbus_client.subscribe_to_signals(part_callback, copy_callback,
-                                     boot_callback)
-
-    try:
-        utils.check_python_version()
-    except InvalidVersionError as ex:
-        print(ex)
-        sys.exit(1)
 
     try:
-        import weresync.plugins as plugins
-        manager = plugins.get_manager()
-        manager.collectPlugins()
         default_part_mask = "{0}{1}"
-        pluginNames = []
-        for pluginInfo in manager.getAllPlugins():
-            pluginNames.append(pluginInfo.plugin_object.name)
-        epilog_string = (
-            _("Bootloader plugins found: ") + ", ".join(pluginNames))
-        parser = argparse.ArgumentParser(epilog=epilog_string)
-        parser.add_argument(
-            "source",
-            help=_("The drive to copy data from. This drive will not be"
-                   " edited."))
-        parser.add_argument(
-            "target",
-            help=_("The drive to copy data to. ALL DATA ON THIS DRIVE WILL BE "
-                   "ERASED."))
-        parser.add_argument(
-            "-C",
-            "--check-and-partition",
-            action="store_true",
-            help=_("Check if partitions are valid and re-partition drive to "
-                   "proper partitions if they are not."))
-        parser.add_argument(
-            "-s",
-            "--source-mask",
-            help=_("A string of format '{0}{1}' where {0} represents drive "
-                   "identifier and {1} represents partition number to point "
-                   "to partition block files for the source drive."))
-        parser.add_argument(
-            "-t",
-            "--target-mask",
-            help=_("A string of format '{0}{1}' where {0} represents drive "
-                   "identifier and {1} represents partition number to point "
-                   "to partition block files for the target drive."))
-        parser.add_argument(
-            "-e",
-            "--excluded-partitions",
-            help=_("A comment separated list of partitions of the source "
-                   "drive to apply no actions on.perated list of partitions "
-                   "of the source drive to apply no actions on."))
-        parser.add_argument(
-            "-b",
-            "--break-on-error",
-            action="store_false",
-            help=_("Causes program to break whenever a partition cannot be "
-                   "copied, including uncopyable partitions such as swap"
-                   " files. Not recommended."))
-        parser.add_argument(
-            "-g",
-            "--root-partition",
-            type=int,
-            help=_("The partition mounted on /."),
-            default=-1)
-        parser.add_argument(
-            "-B",
-            "--boot-partition",
-            type=int,
-            help=_("Partition which should be mounted on /boot"),
-            default=-1)
-        parser.add_argument(
-            "-E",
-            "--efi-partition",
-            type=int,
-            help=_("Partition which should be mounted on /boot/efi"),
-            default=-1)
-        parser.add_argument(
-            "-m",
-            "--source-mount",
-            help=_("Folder where partitions from the source drive should be "
-                   "mounted."),
-            default="")
-        parser.add_argument(
-            "-M",
-            "--target-mount",
-            help=_("Folder where partitions from source drive should be"
-                   " mounted."),
-            default="")
-        parser.add_argument(
-            "-r",
-            "--rsync-args",
-            help=_("List of arguments passed to rsync. Defaults to: ") +
-            device.DEFAULT_RSYNC_ARGS,
-            default=device.DEFAULT_RSYNC_ARGS)
-        parser.add_argument(
-            "-L",
-            "--bootloader",
-            help=_("Passed to decide what boootloader plugin to use. See "
-                   "below for list of plugins. Defaults to simply changing "
-                   "the UUIDs of files in /boot."),
-            default="uuid_copy")
-        parser.add_argument(
-            "-l",
-            "--lvm",
-            help=_("The name of the source logical volume."),
-            nargs="+")
-        group = parser.add_mutually_exclusive_group()
-        group.add_argument(
-            "-v",
-            "--verbose",
-            help=_("Prints expanded output."),
-            action="store_const",
-            dest="loglevel",
-            const=logging.INFO)
-        group.add_argument(
-            "-d",
-            "--debug",
-            help=_("Prints large output. Mainly helpful for developers."),
-            action="store_const",
-            dest="loglevel",
-            const=logging.DEBUG)
-        args = parser.parse_args()
+        args = _get_parser().parse_args()
+        # Only connect to the daemon once the arguments are known to be valid,
+        # so --help and argument errors do not pay for the dbus connection.
+        copy_drive = dbus_client.get_copy_drive()
+        if not copy_drive:
+            LOGGER.error("Failed to connect to dbus service. Is it running?")
+            LOGGER.log(logging.DEBUG, "DBus Connection error:",
+                       dbus_client.get_error())
+            return
+        dbus_client.subscribe_to_signals(part_callback, copy_callback,
+                                         boot_callback)
         if (args.loglevel == logging.INFO or args.loglevel == logging.DEBUG):
             loglevel = args.loglevel
         else:
@@ -230,26 +285,23 @@ def main():
         utils.start_logging_handler(
             utils.DEFAULT_USER_LOG_LOCATION, stream_level=loglevel)
         mount_points = (args.source_mount, args.target_mount)
-        if args.lvm is not None and len(args.lvm) > 2:
+        lvm = args.lvm or ()
+        if len(lvm) > 2:
             LOGGER.warning(
                 _("More than two lvm options added. Please give "
                   "either one or two options."))
             sys.exit(1)
 
-        lvm_source = args.lvm[0] if args.lvm is not None else ""
-        lvm_target = args.lvm[1] if (args.lvm is not None
-                                     and len(args.lvm) == 2) else ""
+        lvm_source = lvm[0] if lvm else ""
+        lvm_target = lvm[1] if len(lvm) == 2 else ""
 
-        excluded_partitions = [
-            int(x) for x in args.excluded_partitions.split(",")
-        ] if args.excluded_partitions is not None else []
         source_mask = (args.source_mask
                        if args.source_mask is not None else default_part_mask)
         target_mask = (args.target_mask
                        if args.target_mask else default_part_mask)
-        result = dbus_client.copy_drive(
+        result = copy_drive(
             args.source, args.target, args.check_and_partition,
-            source_mask, target_mask, excluded_partitions,
+            source_mask, target_mask, args.excluded_partitions,
             args.break_on_error, args.root_partition, args.boot_partition,
             args.efi_partition, mount_points, args.rsync_args, lvm_source,
             lvm_target, args.bootloader)
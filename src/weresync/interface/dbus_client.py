@@ -14,30 +14,70 @@
 """Connects the interface applications (cli and gui) with the backend daemon.
 
 See also :mod:`weresync.daemon.daemon`"""
-from pydbus import SystemBus
-from gi.repository import GLib
 import threading
-import gi.repository.GLib
-
-try:
-    bus = SystemBus()
-    drive_copier = bus.get("net.manilas.weresync.DriveCopier")
-    copy_drive = drive_copier.CopyDrive
-    """A function which connects to :meth:`weresync.daemon.device.copy_drive`:.
-    For arguments see that function's documentation. If False, WereSync failed
-    to connect to dbus."""
-    error = None
-except gi.repository.GLib.Error as e:
-    error = e
-    """The error created by connecting to dbus. If no error, then None."""
-    copy_drive = False
+import functools
+
+BUS_NAME = "net.manilas.weresync.DriveCopier"
+"""The dbus name (and interface name) the WereSync daemon is published
+under."""
+
+
+@functools.lru_cache(maxsize=1)
+def _connect():
+    """Connects to the WereSync daemon over the system bus. The connection is
+    only made on the first call, so importing this module stays cheap.
+
+    :returns: a tuple of the system bus, the dbus proxy object and the error
+              raised while connecting. If connecting failed the first two are
+              None, otherwise the error is None."""
+    from pydbus import SystemBus
+    from gi.repository import GLib
+    try:
+        bus = SystemBus()
+        return bus, bus.get(BUS_NAME), None
+    except GLib.Error as e:
+        return None, None, e
+
+
+def get_drive_copier():
+    """Returns the dbus proxy for the daemon, or None if WereSync failed to
+    connect to dbus."""
+    return _connect()[1]
+
+
+def get_copy_drive():
+    """Returns a function which connects to
+    :meth:`weresync.daemon.copier.DriveCopier.CopyDrive`. For arguments see
+    that function's documentation. If False, WereSync failed to connect to
+    dbus."""
+    drive_copier = get_drive_copier()
+    return drive_copier.CopyDrive if drive_copier is not None else False
+
+
+def get_error():
+    """Returns the error created by connecting to dbus. If no error, then
+    None."""
+    return _connect()[2]
 
 
 def _unthreaded_subscribe_to_signals(
         partition_status_callback, copy_status_callback, boot_status_callback):
-    drive_copier.PartitionStatus.connect(partition_status_callback)
-    drive_copier.CopyStatus.connect(copy_status_callback)
-    drive_copier.BootStatus.connect(boot_status_callback)
+    from gi.repository import GLib
+    callbacks = {
+        "PartitionStatus": partition_status_callback,
+        "CopyStatus": copy_status_callback,
+        "BootStatus": boot_status_callback
+    }
+
+    def dispatch(sender, object_path, iface, signal, params):
+        callback = callbacks.get(signal)
+        if callback is not None:
+            callback(*params)
+
+    # One subscription for every daemon signal, rather than one per signal
+    # through the proxy object.
+    bus = _connect()[0]
+    bus.subscribe(sender=BUS_NAME, iface=BUS_NAME, signal_fired=dispatch)
     loop = GLib.MainLoop()
     loop.run()
 
@@ -13,33 +13,85 @@
 # limitations under the License.
 """This module runs the GUI for WereSync."""
 
-import weresync.plugins as plugins
 import weresync.utils as utils
-import weresync.daemon.device as device
-from weresync.exception import InvalidVersionError
+import weresync.interface.dbus_client as dbus_client
 import subprocess
 import gi
 import sys
 import os
 import logging
-import logging.handlers
 import threading
+import queue
+import functools
+import re
+import time
 gi.require_version("Gtk", '3.0')
-from gi.repository import Gtk, GLib, GObject  # noqa
-
-connected = False
-
-try:
-    import weresync.interface.dbus_client as dbus_client
-    connected = True
-except GLib.GError as ex:
-    pass
+from gi.repository import Gtk, Gdk, GLib, Gio  # noqa
 
 
 LOGGER = logging.getLogger(__name__)
 
 DEFAULT_HORIZONTAL_PADDING = 5
 DEFAULT_VERTICAL_PADDING = 3
+PROGRESS_UPDATE_INTERVAL = 33000
+"""The minimum time, in microseconds, between two updates of the same progress
+bar. Roughly matches a 30 Hz refresh rate."""
+EXCLUDE_SPLIT_REGEX = re.compile(r"[,\s]+")
+"""Splits the excluded partitions entry on commas and whitespace."""
+LABEL_STYLE_CLASS = "weresync-label"
+LABEL_CSS = ".{0} {{ padding: {1}px {2}px; }}".format(
+    LABEL_STYLE_CLASS, DEFAULT_VERTICAL_PADDING, DEFAULT_HORIZONTAL_PADDING)
+"""Pads labels the same amount the old xpad and ypad values did."""
+DEFAULT_PLUGIN = "uuid_copy"
+"""The bootloader plugin selected when the window opens."""
+SYS_BLOCK = "/sys/block"
+"""The folder the kernel lists every block device in."""
+PROBE_TIMEOUT = 5
+"""The number of seconds ``vgs`` is given to list volume groups before it is
+killed, since it can hang while disks are under heavy load."""
+PROBE_CACHE_TTL = 2
+"""The number of seconds the drive and volume group lists are reused for."""
+
+_probe_cache = {}
+
+
+class GObjectWorker:
+    """Runs functions on a single background daemon thread and passes their
+    results back to the GTK main loop.
+
+    Functions are run in the order they are sent."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            func, args, kargs, callback, errorback = self.queue.get()
+            try:
+                result = func(*args, **kargs)
+            except Exception as ex:
+                LOGGER.debug("Full exception info:\n", exc_info=sys.exc_info())
+                if errorback is not None:
+                    GLib.idle_add(errorback, ex)
+            else:
+                if callback is not None:
+                    GLib.idle_add(callback, result)
+
+    def send(self, func, args=(), kargs=None, callback=None, errorback=None):
+        """Queues ``func`` to be run on the worker thread.
+
+        :param func: the function to run.
+        :param args: positional arguments passed to ``func``.
+        :param kargs: keyword arguments passed to ``func``.
+        :param callback: if not None, called on the main thread with the
+                         return value of ``func``.
+        :param errorback: if not None, called on the main thread with the
+                          exception raised by ``func``."""
+        kargs = kargs or {}
+        self.queue.put((func, args, kargs, callback, errorback))
 
 
 class NumberEntry(Gtk.Entry):
@@ -51,12 +103,98 @@ class NumberEntry(Gtk.Entry):
                         and spaces. Defaults to none."""
         Gtk.Entry.__init__(self, *args, **kargs)
         self.allowed = allowed
+        self._disallowed = re.compile("[^0-9" + re.escape(allowed) + "]")
+        self._pending = False
         self.connect('changed', self.on_changed)
 
     def on_changed(self, *args):
+        # Filtering is deferred to an idle callback so a burst of changes,
+        # such as a paste, is only filtered once.
+        if self._pending:
+            return
+        self._pending = True
+        GLib.idle_add(self._do_filter)
+
+    def _do_filter(self):
+        self._pending = False
         text = self.get_text()
-        self.set_text("".join(
-            [i for i in text if i in "0123456789" + self.allowed]))
+        filtered = self._disallowed.sub("", text)
+        if filtered != text:
+            self.set_text(filtered)
+        return False
+
+
+def collect_plugins():
+    """Finds the available bootloader plugins. This searches the plugin folders
+    and imports every plugin, so it should not be run on the main thread.
+
+    The plugins are only listed here, since the daemon is the one which runs
+    them, so none are activated.
+
+    :returns: a list of (index, pretty name, name) tuples, one per plugin."""
+    import weresync.plugins as plugins
+    manager = plugins.collect_plugins()
+    plugin_list = []
+    plugins_added = []
+    for idx, pluginInfo in enumerate(manager.getAllPlugins()):
+        obj = pluginInfo.plugin_object
+        if pluginInfo.name not in plugins_added:
+            plugin_list.append((idx, obj.prettyName, obj.name))
+            plugins_added.append(pluginInfo.name)
+        else:
+            LOGGER.debug("Not adding {name} at {path} because plugin"
+                         "already added".format(
+                             name=pluginInfo.name, path=pluginInfo.path))
+    return plugin_list
+
+
+def show_dialog(dialog, on_response=None):
+    """Shows ``dialog`` as a modal dialog without blocking in a nested main
+    loop, so progress updates keep arriving while it is open. The dialog is
+    destroyed once it is answered or closed.
+
+    :param dialog: the :py:class:`Gtk.Dialog` to show.
+    :param on_response: if not None, called with the response id after the
+                        dialog is destroyed."""
+
+    def response(dialog, response_id):
+        dialog.destroy()
+        if on_response is not None:
+            on_response(response_id)
+
+    dialog.set_modal(True)
+    dialog.connect("response", response)
+    dialog.present()
+
+
+def fill_combos(combos, rows):
+    """Appends ``rows`` to the model shared by ``combos``. The model is
+    detached from the combo boxes while it is filled, so they only react to
+    the change once rather than once per row. The active row of each combo
+    box is kept.
+
+    :param combos: the combo boxes which all display the same model.
+    :param rows: an iterable of rows to append to the model."""
+    model = combos[0].get_model()
+    active = [combo.get_active() for combo in combos]
+    for combo in combos:
+        combo.set_model(None)
+    for row in rows:
+        model.append(row)
+    for combo, index in zip(combos, active):
+        combo.set_model(model)
+        combo.set_active(index)
+
+
+def on_main(func):
+    """Returns a function which schedules ``func`` to be run on the GTK main
+    loop with whatever arguments it is passed. The returned function is safe to
+    call from any thread."""
+
+    def call_on_main(*args):
+        GLib.idle_add(func, *args)
+
+    return call_on_main
 
 
 def set_margin(widget,
@@ -64,124 +202,190 @@ def set_margin(widget,
                left=DEFAULT_HORIZONTAL_PADDING,
                top=DEFAULT_VERTICAL_PADDING,
                bottom=DEFAULT_VERTICAL_PADDING):
-    widget.set_margin_right(right)
-    widget.set_margin_left(left)
-    widget.set_margin_top(top)
-    widget.set_margin_bottom(bottom)
+    # The start/end margins replace the deprecated left/right ones, and
+    # setting them together only emits one batch of notifications.
+    widget.set_properties(margin_end=right, margin_start=left,
+                          margin_top=top, margin_bottom=bottom)
+
+
+@functools.lru_cache(maxsize=1)
+def _install_label_style():
+    """Adds the padding for :py:func:`create_label` labels to the default
+    screen. This only has to happen once."""
+    provider = Gtk.CssProvider()
+    provider.load_from_data(LABEL_CSS.encode("utf-8"))
+    Gtk.StyleContext.add_provider_for_screen(
+        Gdk.Screen.get_default(), provider,
+        Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+
+
+def create_label(text=""):
+    """Creates a start aligned label padded like every other label in the
+    window. The padding comes from a shared CSS class, rather than the
+    deprecated per-label xpad and ypad properties.
+
+    :param text: the text of the label."""
+    _install_label_style()
+    label = Gtk.Label(label=text, halign=Gtk.Align.START)
+    label.get_style_context().add_class(LABEL_STYLE_CLASS)
+    return label
 
 
 def create_help_box(parent, text, title=""):
-    help = Gtk.Label(
-        halign=Gtk.Align.START,
-        xpad=DEFAULT_HORIZONTAL_PADDING,
-        ypad=DEFAULT_VERTICAL_PADDING)
+    help = create_label()
     help.set_markup(_("<a href=\"#\">What's this?</a>"))
 
+    dialog = None
+
     def help_click(*args):
-        dialog = Gtk.MessageDialog(parent, 0, Gtk.MessageType.INFO,
-                                   Gtk.ButtonsType.OK, title)
-        dialog.format_secondary_text(text)
+        # The dialog is built on the first click and hidden, rather than
+        # destroyed, so later clicks can reuse it.
+        nonlocal dialog
+        if dialog is None:
+            dialog = Gtk.MessageDialog(parent, 0, Gtk.MessageType.INFO,
+                                       Gtk.ButtonsType.OK, title)
+            dialog.format_secondary_text(text)
+            dialog.set_modal(True)
+            # hide_on_delete only takes the widget, not the event
+            dialog.connect("delete-event",
+                           lambda d, event: d.hide_on_delete())
+            dialog.connect("response", lambda d, response: d.hide())
         dialog.set_default_size(parent.get_size()[0], -1)
-        dialog.run()
-        dialog.destroy()
+        dialog.present()
         return True
 
     help.connect("activate-link", help_click)
     return help
 
 
+def _cached_probe(func):
+    """Caches the result of a device listing function for
+    :py:data:`PROBE_CACHE_TTL` seconds, so windows opened in quick succession
+    do not run the same command again."""
+
+    @functools.wraps(func)
+    def wrapper():
+        now = time.monotonic()
+        cached = _probe_cache.get(func.__name__)
+        if cached is not None and now - cached[0] < PROBE_CACHE_TTL:
+            return cached[1]
+        result = func()
+        _probe_cache[func.__name__] = (now, result)
+        return result
+
+    return wrapper
+
+
+@_cached_probe
 def generate_drive_list():
-    proc = subprocess.Popen(
-        ["lsblk", "-dnoNAME"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT)
-    output, _ = proc.communicate()
-    if proc.returncode != 0:
-        LOGGER.critical("Error reading block list.\n" + output)
-    device_list = [
-        "/dev/" + x.strip() for x in str(output, "utf-8").split("\n")
-        if x.strip() != ""
-    ]
+    """Returns a list of the drives on the system, read from /sys/block, or
+    None if /sys is not available. In that case see
+    :py:func:`weresync.utils.parse_proc_partitions`.
+
+    RAM disks, device mapper targets and unused loop devices are left out."""
+    try:
+        names = sorted(os.listdir(SYS_BLOCK))
+    except OSError:
+        LOGGER.debug("Could not read " + SYS_BLOCK, exc_info=sys.exc_info())
+        return None
+    device_list = []
+    for name in names:
+        if name.startswith(("ram", "dm-")):
+            continue
+        # Only loop devices with an image attached have a backing file
+        if name.startswith("loop") and not os.path.exists(
+                os.path.join(SYS_BLOCK, name, "loop", "backing_file")):
+            continue
+        device_list.append("/dev/" + name)
     return device_list
 
 
+@_cached_probe
 def generate_vg_list():
+    """Returns a list of the volume groups on the system. This blocks for up
+    to :py:data:`PROBE_TIMEOUT` seconds, so it should not be run on the main
+    thread."""
     try:
         lvm_proc = subprocess.Popen(
             ["vgs", "-o", "name", "--noheadings"],
             stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT)
-        lvm_output, _ = lvm_proc.communicate()
-        out = str(lvm_output, "utf-8").split("\n")
-        if lvm_proc.returncode != 0:
-            LOGGER.critical("Error reading volume group list.\n" +
-                            " ".join(out))
-        if "No volume groups found" in out:
-            lvm_list = ["No volume groups found"]
-        else:
-            lvm_list = ["/dev/" + x.strip() for x in out if x.strip() != ""]
-    except FileNotFoundError as ex:
+            stderr=subprocess.PIPE)
+    except FileNotFoundError:
         # Probably means LVM is not installed on the system, which is no big
         # deal. We'll just log the exception and move on
         LOGGER.debug("File not found info: ", exc_info=sys.exc_info())
-        lvm_list = []  # This variable needs to be defined
-
-    return lvm_list
+        return []
+    try:
+        lvm_output, lvm_error = lvm_proc.communicate(timeout=PROBE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        lvm_proc.kill()
+        lvm_proc.communicate()
+        LOGGER.warning("vgs timed out while listing volume groups.")
+        return []
+    if lvm_proc.returncode != 0:
+        LOGGER.critical("Error reading volume group list.\n" +
+                        str(lvm_error, "utf-8"))
+    # Only the names are written to stdout, messages such as "No volume
+    # groups found" go to stderr.
+    return [
+        "/dev/" + x.strip() for x in str(lvm_output, "utf-8").split("\n")
+        if x.strip() != ""
+    ]
 
 
+@functools.lru_cache(maxsize=None)
 def get_resource(resource):
-    dir = os.path.dirname(__file__)
-    rel_resource_path = os.path.join(dir, "../resources", resource)
-    return os.path.abspath(rel_resource_path)
+    """Returns the absolute path of a file in the weresync.resources
+    package."""
+    import weresync.resources
+    return os.path.join(os.path.dirname(weresync.resources.__file__),
+                        resource)
 
 
 class WereSyncWindow(Gtk.Window):
     def __init__(self, title="WereSync"):
         super().__init__(title=title)
-        # Find all the bootloader plugins available
-        manager = plugins.get_manager()
-        manager.collectPlugins()
+        self._worker = GObjectWorker()
+        self.progress_grid = None
+        self._last_update = {}
+        # The latest update of each progress bar held back by _throttle
+        self._deferred = {}
+        # Progress values received on the dbus thread wait here until the
+        # main loop applies them, so a burst of signals causes one redraw.
+        self._pending_lock = threading.Lock()
+        self._pending_part = None
+        self._pending_copy = {}
+        self._progress_scheduled = False
+        # Signals arrive on the dbus thread, so these are created once and
+        # forward each signal to the main loop. copy_callback and
+        # queue_part_progress do their own forwarding.
+        self._boot_callback_main = on_main(self.boot_callback)
+        self._subscribed = False
+        # Plugins are found on the worker thread and filled in once loaded,
+        # see _on_plugins_collected.
         plugin_store = Gtk.ListStore(int, str, str)
-        plugins_added = []
-        uuid_index = 0
-        for idx, pluginInfo in enumerate(manager.getAllPlugins()):
-            manager.activatePluginByName(pluginInfo.name)
-            obj = pluginInfo.plugin_object
-            if pluginInfo.name not in plugins_added:
-                plugin_store.append([idx, obj.prettyName, obj.name])
-                plugins_added.append(pluginInfo.name)
-                if obj.name == "uuid_copy":
-                    uuid_index = idx
-            else:
-                LOGGER.debug("Not adding {name} at {path} because plugin"
-                             "already added".format(
-                                 name=pluginInfo.name, path=pluginInfo.path))
 
         self.set_icon_from_file(get_resource("weresync.svg"))
         self.grid = Gtk.Grid()
+        # Child notifications are held back until every widget is attached
+        self.grid.freeze_child_notify()
         self.add(self.grid)
-        self.source_label = Gtk.Label(
-            label=_("Source Drive: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
-        name_store = Gtk.ListStore(int, str)
-        for idx, val in enumerate(generate_drive_list()):
-            name_store.append([idx, val])
+        self.source_label = create_label(_("Source Drive: "))
+        # The drive list is filled in once the worker thread has found it,
+        # see _on_drives_listed. Volume groups are only looked up once the
+        # LVM option is turned on, see lvm_button_toggled.
+        name_store = Gtk.ListStore(str)
+        self._worker.send(generate_drive_list, callback=self._on_drives_listed)
         self.source_combo = Gtk.ComboBox.new_with_model_and_entry(name_store)
         self.source_combo.set_hexpand(True)
-        self.source_combo.set_entry_text_column(1)
+        self.source_combo.set_entry_text_column(0)
         self.grid.attach(self.source_label, 1, 1, 1, 1)
         self.grid.attach_next_to(self.source_combo, self.source_label,
                                  Gtk.PositionType.RIGHT, 1, 1)
-        self.target_label = Gtk.Label(
-            label=_("Target Drive: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.target_label = create_label(_("Target Drive: "))
         self.target_combo = Gtk.ComboBox.new_with_model_and_entry(name_store)
         self.target_combo.set_hexpand(True)
-        self.target_combo.set_entry_text_column(1)
+        self.target_combo.set_entry_text_column(0)
         self.grid.attach_next_to(self.target_label, self.source_label,
                                  Gtk.PositionType.BOTTOM, 1, 1)
         self.grid.attach_next_to(self.target_combo, self.target_label,
@@ -189,37 +393,25 @@ class WereSyncWindow(Gtk.Window):
         box = Gtk.Box()
         self.grid.attach_next_to(box, self.source_combo,
                                  Gtk.PositionType.RIGHT, 1, 1)
-        self.lvm_source_label = Gtk.Label(
-            label=_("Source VG: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
-        lvm_list = generate_vg_list()
-        lvm_source_store = Gtk.ListStore(int, str)
-        for idx, val in enumerate(lvm_list):
-            lvm_source_store.append([idx, val])
+        self.lvm_source_label = create_label(_("Source VG: "))
+        lvm_source_store = Gtk.ListStore(str)
         self.lvm_source_combo = Gtk.ComboBox.new_with_model_and_entry(
             lvm_source_store)
         self.lvm_source_combo.set_hexpand(True)
-        self.lvm_source_combo.set_entry_text_column(1)
+        self.lvm_source_combo.set_entry_text_column(0)
         self.lvm_source_combo.set_sensitive(False)
         self.grid.attach_next_to(self.lvm_source_label, box,
                                  Gtk.PositionType.RIGHT, 1, 1)
         self.grid.attach_next_to(self.lvm_source_combo, self.lvm_source_label,
                                  Gtk.PositionType.RIGHT, 1, 1)
-        self.lvm_target_label = Gtk.Label(
-            label=_("Target VG: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
-        lvm_target_store = Gtk.ListStore(int, str)
-        lvm_target_store.append([1, _("Default")])
-        for idx, val in enumerate(lvm_list):
-            lvm_target_store.append([idx, val])
+        self.lvm_target_label = create_label(_("Target VG: "))
+        lvm_target_store = Gtk.ListStore(str)
+        lvm_target_store.append([_("Default")])
+        self._vgs_requested = False
         self.lvm_target_combo = Gtk.ComboBox.new_with_model_and_entry(
             lvm_target_store)
         self.lvm_target_combo.set_hexpand(True)
-        self.lvm_target_combo.set_entry_text_column(1)
+        self.lvm_target_combo.set_entry_text_column(0)
         self.lvm_target_combo.set_active(0)
         self.lvm_target_combo.set_sensitive(False)
         self.grid.attach_next_to(self.lvm_target_label, self.lvm_source_label,
@@ -238,15 +430,12 @@ class WereSyncWindow(Gtk.Window):
         self.grid.attach_next_to(self.lvm_button, self.lvm_target_label,
                                  Gtk.PositionType.BOTTOM, 2, 1)
         set_margin(self.lvm_button)
-        self.bootloader_label = Gtk.Label(
-            label=_("Bootloader Plugin: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.bootloader_label = create_label(_("Bootloader Plugin: "))
         self.bootloader_combo = Gtk.ComboBox.new_with_model_and_entry(
             plugin_store)
         self.bootloader_combo.set_entry_text_column(1)
-        self.bootloader_combo.set_active(uuid_index)
+        self._worker.send(collect_plugins,
+                          callback=self._on_plugins_collected)
         self.bootloader_help = create_help_box(
             self,
             _("This is the plugin which will attempt to make your clone"
@@ -261,11 +450,8 @@ class WereSyncWindow(Gtk.Window):
                                  Gtk.PositionType.RIGHT, 1, 1)
         self.grid.attach_next_to(self.bootloader_help, self.bootloader_combo,
                                  Gtk.PositionType.RIGHT, 1, 1)
-        self.bootloader_partition_label = Gtk.Label(
-            label=_("Root Partition Number: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.bootloader_partition_label = create_label(
+            _("Root Partition Number: "))
         self.grid.attach_next_to(self.bootloader_partition_label,
                                  self.bootloader_label,
                                  Gtk.PositionType.BOTTOM, 1, 1)
@@ -284,11 +470,7 @@ class WereSyncWindow(Gtk.Window):
                                  self.bootloader_partition_entry,
                                  Gtk.PositionType.RIGHT, 1, 1)
         # Start adding advanced options
-        self.boot_part_label = Gtk.Label(
-            label=_("Boot Partition: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.boot_part_label = create_label(_("Boot Partition: "))
         self.grid.attach_next_to(self.boot_part_label, self.lvm_button,
                                  Gtk.PositionType.BOTTOM, 1, 1)
         self.boot_part_entry = NumberEntry()
@@ -300,11 +482,7 @@ class WereSyncWindow(Gtk.Window):
         self.grid.attach_next_to(self.boot_help, self.boot_part_entry,
                                  Gtk.PositionType.RIGHT, 1, 1)
         self.expander = Gtk.Expander(label=_("Advanced Options"))
-        self.efi_partition_label = Gtk.Label(
-            label=_("EFI Partition Number: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.efi_partition_label = create_label(_("EFI Partition Number: "))
         self.grid.attach_next_to(self.efi_partition_label,
                                  self.boot_part_label, Gtk.PositionType.BOTTOM,
                                  1, 1)
@@ -325,6 +503,7 @@ class WereSyncWindow(Gtk.Window):
         set_margin(self.expander)
         self.expander.set_resize_toplevel(True)
         self.expand_grid = Gtk.Grid()
+        self.expand_grid.freeze_child_notify()
         self.expander.add(self.expand_grid)
         self.expander.set_hexpand(True)
         self.ignore_errors = Gtk.CheckButton(
@@ -335,11 +514,8 @@ class WereSyncWindow(Gtk.Window):
         set_margin(self.ignore_errors)
         self.expand_grid.attach(self.ignore_errors, 1, 1, 3, 1)
 
-        self.source_part_mask_label = Gtk.Label(
-            label=_("Source Partition Mask: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.source_part_mask_label = create_label(
+            _("Source Partition Mask: "))
         self.expand_grid.attach_next_to(self.source_part_mask_label,
                                         self.ignore_errors,
                                         Gtk.PositionType.BOTTOM, 1, 1)
@@ -359,11 +535,8 @@ class WereSyncWindow(Gtk.Window):
         self.expand_grid.attach_next_to(self.part_mask_help,
                                         self.source_part_mask_entry,
                                         Gtk.PositionType.RIGHT, 1, 1)
-        self.target_part_mask_label = Gtk.Label(
-            label=_("Target Partition Mask: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.target_part_mask_label = create_label(
+            _("Target Partition Mask: "))
         self.expand_grid.attach_next_to(self.target_part_mask_label,
                                         self.source_part_mask_label,
                                         Gtk.PositionType.BOTTOM, 1, 1)
@@ -373,11 +546,7 @@ class WereSyncWindow(Gtk.Window):
         self.expand_grid.attach_next_to(self.target_part_mask_entry,
                                         self.target_part_mask_label,
                                         Gtk.PositionType.RIGHT, 1, 1)
-        self.excluded_label = Gtk.Label(
-            label=_("Excluded Partitions: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.excluded_label = create_label(_("Excluded Partitions: "))
         self.expand_grid.attach_next_to(self.excluded_label,
                                         self.target_part_mask_label,
                                         Gtk.PositionType.BOTTOM, 1, 1)
@@ -396,14 +565,11 @@ class WereSyncWindow(Gtk.Window):
                                         self.excluded_entry,
                                         Gtk.PositionType.RIGHT, 1, 1)
 
-        self.rsync_label = Gtk.Label(
-            label=_("Rsync Arguments: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.rsync_label = create_label(_("Rsync Arguments: "))
         self.expand_grid.attach_next_to(self.rsync_label, self.part_mask_help,
                                         Gtk.PositionType.RIGHT, 1, 1)
-        self.rsync_entry = Gtk.Entry(text=device.DEFAULT_RSYNC_ARGS)
+        from weresync.daemon.device import DEFAULT_RSYNC_ARGS
+        self.rsync_entry = Gtk.Entry(text=DEFAULT_RSYNC_ARGS)
         self.expand_grid.attach_next_to(self.rsync_entry, self.rsync_label,
                                         Gtk.PositionType.RIGHT, 1, 1)
         self.rsync_help = create_help_box(
@@ -414,11 +580,7 @@ class WereSyncWindow(Gtk.Window):
             _("Rsync Arguments"))
         self.expand_grid.attach_next_to(self.rsync_help, self.rsync_entry,
                                         Gtk.PositionType.RIGHT, 1, 1)
-        self.source_mount_label = Gtk.Label(
-            label=_("Source Drive Mount Point: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        self.source_mount_label = create_label(_("Source Drive Mount Point: "))
         self.expand_grid.attach_next_to(self.source_mount_label,
                                         self.rsync_label,
                                         Gtk.PositionType.BOTTOM, 1, 1)
@@ -450,6 +612,7 @@ class WereSyncWindow(Gtk.Window):
                                         self.target_mount_label,
                                         Gtk.PositionType.RIGHT, 1, 1)
 
+        self.expand_grid.thaw_child_notify()
         # End advanced options
         self.grid.attach_next_to(self.expander,
                                  self.bootloader_partition_label,
@@ -459,9 +622,40 @@ class WereSyncWindow(Gtk.Window):
         self.start.set_hexpand(False)
         self.grid.attach(self.start, 6, 10, 1, 1)
         self.start.connect("clicked", self.start_pressed)
+        self.grid.thaw_child_notify()
+
+    def _on_drives_listed(self, drive_list):
+        name_store = self.source_combo.get_model()
+        if drive_list is None:
+            # /sys is not mounted, so /proc/partitions is read without blocking
+            # the main loop and the store is filled in once it is loaded.
+            Gio.File.new_for_path("/proc/partitions").load_contents_async(
+                None, self._on_partitions_loaded, name_store)
+            return
+        fill_combos((self.source_combo, self.target_combo),
+                    ([val] for val in drive_list))
+
+    def _on_vgs_listed(self, lvm_list):
+        rows = [[val] for val in lvm_list]
+        fill_combos((self.lvm_source_combo,), rows)
+        fill_combos((self.lvm_target_combo,), rows)
+
+    def _on_partitions_loaded(self, gfile, result, name_store):
+        try:
+            success, contents, etag = gfile.load_contents_finish(result)
+        except GLib.GError as ex:
+            LOGGER.critical("Error reading /proc/partitions.\n" + str(ex))
+            return
+        fill_combos((self.source_combo, self.target_combo),
+                    ([val] for val in utils.parse_proc_partitions(
+                        str(contents, "utf-8"))))
 
     def lvm_button_toggled(self, button):
         if self.lvm_button.get_active():
+            if not self._vgs_requested:
+                self._vgs_requested = True
+                self._worker.send(generate_vg_list,
+                                  callback=self._on_vgs_listed)
             self.lvm_source_combo.set_sensitive(True)
             self.lvm_target_combo.set_sensitive(True)
         else:
@@ -475,8 +669,7 @@ class WereSyncWindow(Gtk.Window):
         combo_iter = combo.get_active_iter()
         if combo_iter is not None:
             model = combo.get_model()
-            row_id, val = model[combo_iter][:2]
-            return val
+            return model[combo_iter][0]
         else:
             entry = combo.get_child()
             return entry.get_text()
@@ -502,11 +695,19 @@ class WereSyncWindow(Gtk.Window):
              "same as the source drives. Is "
              "this what you want to do?").format(
                  drive=self.target, lvm=(lvm_target if is_lvm else "")))
-        response = confirm_dialog.run()
-        confirm_dialog.destroy()
-        if response == Gtk.ResponseType.CANCEL:
-            return
-        # The user didn't cancel so we can continue running
+
+        def confirmed(response):
+            # Closing the dialog any other way is treated as cancelling
+            if response == Gtk.ResponseType.OK:
+                self._start_copy(lvm_target)
+
+        show_dialog(confirm_dialog, confirmed)
+
+    def _start_copy(self, lvm_target):
+        """Starts the clone once the user has confirmed it. Reads the options
+        from the form and sends the copy to the worker thread.
+
+        :param lvm_target: the target volume group, or "" for the default."""
         copy_if_invalid = self.copy_partitions_button.get_active()
         efi_part = int(self.efi_partition_entry.get_text(
         )) if self.efi_partition_entry.get_text().strip() != "" else -1
@@ -515,12 +716,11 @@ class WereSyncWindow(Gtk.Window):
         ignore_errors = self.ignore_errors.get_active()
         self.source_part_mask = self.source_part_mask_entry.get_text()
         self.target_part_mask = self.target_part_mask_entry.get_text()
-        exclude_text = self.excluded_entry.get_text().strip()
-        if exclude_text == "":
-            excluded_parts = []
-        else:
-            exclude_text.replace(" ", "")
-            excluded_parts = [int(x) for x in exclude_text.split(",")]
+        excluded_parts = [
+            int(x)
+            for x in EXCLUDE_SPLIT_REGEX.split(self.excluded_entry.get_text())
+            if x
+        ]
         boot_part = int(self.boot_part_entry.get_text()
                         ) if self.boot_part_entry.get_text() != "" else -1
         rsync_args = self.rsync_entry.get_text()
@@ -530,55 +730,65 @@ class WereSyncWindow(Gtk.Window):
                         target_mount if target_mount is not None else "")
         boot_iter = self.bootloader_combo.get_active_iter()
         model = self.bootloader_combo.get_model()
-        plugin_name = model[boot_iter][2]
+        # Plugins may still be loading, so fall back to the default plugin
+        plugin_name = (model[boot_iter][2] if boot_iter is not None
+                       else DEFAULT_PLUGIN)
         try:
             self._generate_progress_grid()
             self.remove(self.grid)
             self.add(self.progress_grid)
 
-            dbus_client.subscribe_to_signals(
-                lambda x: GLib.idle_add(self.part_callback, x),
-                lambda num, prog: GLib.idle_add(self.copy_callback, num, prog),
-                lambda done: GLib.idle_add(self.boot_callback, done))
-
-            def copy(callback, error):
-                try:
-                    result = dbus_client.copy_drive(
-                        self.source, self.target, copy_if_invalid,
-                        self.source_part_mask, self.target_part_mask,
-                        excluded_parts, ignore_errors, bootloader_part,
-                        boot_part, efi_part, mount_points, rsync_args,
-                        self.lvm_source, lvm_target, plugin_name)
-                    callback(result)
-                except Exception as ex:
-                    LOGGER.debug(
-                        "Full exception info:\n", exc_info=sys.exc_info())
-                    error(ex)
-
-            copy_thread = threading.Thread(
-                target=copy,
-                args=[
-                    lambda result: GLib.idle_add(self._copy_finished, result),
-                    lambda ex: GLib.idle_add(self._show_error, ex)
-                ])
-            copy_thread.start()
+            if not self._subscribed:
+                dbus_client.subscribe_to_signals(self.queue_part_progress,
+                                                 self.copy_callback,
+                                                 self._boot_callback_main)
+                self._subscribed = True
+
+            is_lvm = self.lvm_button.get_active()
+
+            def copy():
+                # Looking up partitions shells out in the daemon, so it is
+                # done here rather than blocking the main thread.
+                partitions = list(dbus_client.get_drive_copier().GetPartitions(
+                    self.source, self.source_part_mask, False))
+                if is_lvm:
+                    partitions += dbus_client.get_drive_copier().GetPartitions(
+                        self.lvm_source, "", True)
+                GLib.idle_add(self._add_partition_progresses, partitions)
+                return dbus_client.get_copy_drive()(
+                    self.source, self.target, copy_if_invalid,
+                    self.source_part_mask, self.target_part_mask,
+                    excluded_parts, ignore_errors, bootloader_part,
+                    boot_part, efi_part, mount_points, rsync_args,
+                    self.lvm_source, lvm_target, plugin_name)
+
+            self._worker.send(copy, callback=self._copy_finished,
+                              errorback=self._show_error)
             self.show_all()
         except Exception as ex:
             LOGGER.debug("Full exception info:\n", exc_info=sys.exc_info())
             self._show_error(ex)
             return
 
+    def _on_plugins_collected(self, plugin_list):
+        """Fills the bootloader combo box with the plugins found by
+        :py:func:`collect_plugins` and selects the default plugin."""
+        fill_combos((self.bootloader_combo,), plugin_list)
+        for pos, (idx, pretty_name, name) in enumerate(plugin_list):
+            if name == DEFAULT_PLUGIN:
+                self.bootloader_combo.set_active(pos)
+
     def _show_error(self, ex):
         """Displays an error in a message dialog."""
         dialog = Gtk.MessageDialog(self, 0, Gtk.MessageType.ERROR,
                                    Gtk.ButtonsType.OK,
                                    _("Error starting clone."))
         dialog.format_secondary_text(str(ex))
-        dialog.run()
-        dialog.destroy()
+        show_dialog(dialog, self._return_to_form)
 
-        # Sets back to original screen to allow regenerating any misplace
-        # parameters.
+    def _return_to_form(self, response=None):
+        """Sets back to original screen to allow regenerating any misplace
+        parameters."""
         self.remove(self.progress_grid)
         self.add(self.grid)
 
@@ -591,62 +801,42 @@ class WereSyncWindow(Gtk.Window):
 
         dialog = Gtk.MessageDialog(self, 0, Gtk.MessageType.INFO,
                                    Gtk.ButtonsType.OK, text)
-        dialog.run()
-        dialog.destroy()
-        self.remove(self.progress_grid)
-        self.add(self.grid)
+        show_dialog(dialog, self._return_to_form)
 
     def _generate_progress_grid(self):
         """Generates the grid for the screen showing progress. Sets
-        `self.progress_grid` as the grid.`"""
+        `self.progress_grid` as the grid.`
+
+        The grid is only built once per window. Later calls reset the
+        progress bars and remove the partition rows of the previous clone."""
+
+        if self.progress_grid is not None:
+            self.part_progress.set_fraction(0.0)
+            self.boot_progress.set_fraction(0.0)
+            for child in self.copy_grid.get_children():
+                child.destroy()
+            self.copy_progresses = {}
+            # Updates held back during the last clone belong to its bars
+            self._last_update.clear()
+            self._deferred.clear()
+            return
 
         self.progress_grid = Gtk.Grid()
-        part_label = Gtk.Label(
-            label=_("Checking partitions and copying: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
+        part_label = create_label(_("Checking partitions and copying: "))
         self.progress_grid.attach(part_label, 1, 1, 1, 1)
         self.part_progress = Gtk.ProgressBar()
         set_margin(self.part_progress)
         self.progress_grid.attach_next_to(self.part_progress, part_label,
                                           Gtk.PositionType.RIGHT, 1, 1)
         self.copy_progresses = {}
-
-        def create_partitions(device, device_part_mask, start_label,
-                              lvm=False):
-            previous_label = start_label
-            partitions = dbus_client.drive_copier.GetPartitions(
-                device, device_part_mask, lvm)
-            for val in partitions:
-                copy_label = Gtk.Label(
-                    label=_("Copying partition {0}: ").format(val),
-                    halign=Gtk.Align.START,
-                    xpad=DEFAULT_HORIZONTAL_PADDING,
-                    ypad=DEFAULT_VERTICAL_PADDING)
-                copy_progress = Gtk.ProgressBar()
-                set_margin(copy_progress)
-                self.progress_grid.attach_next_to(
-                    copy_label, previous_label, Gtk.PositionType.BOTTOM, 1, 1)
-                self.progress_grid.attach_next_to(copy_progress, copy_label,
-                                                  Gtk.PositionType.RIGHT, 1, 1)
-                self.copy_progresses[val] = copy_progress
-                previous_label = copy_label
-
-            return previous_label
-
-        final_label = create_partitions(self.source, self.source_part_mask,
-                                        part_label)
-        if self.lvm_button.get_active():
-            final_label = create_partitions(
-                self.lvm_source, "", final_label, lvm=True)
-
-        boot_label = Gtk.Label(
-            label=_("Making bootable: "),
-            halign=Gtk.Align.START,
-            xpad=DEFAULT_HORIZONTAL_PADDING,
-            ypad=DEFAULT_VERTICAL_PADDING)
-        self.progress_grid.attach_next_to(boot_label, final_label,
+        # Partition rows are added later by _add_partition_progresses, once
+        # the worker thread has looked up the partitions.
+        self.copy_grid = Gtk.Grid()
+        self.progress_grid.attach_next_to(self.copy_grid, part_label,
+                                          Gtk.PositionType.BOTTOM, 2, 1)
+
+        boot_label = create_label(_("Making bootable: "))
+        self.progress_grid.attach_next_to(boot_label, self.copy_grid,
                                           Gtk.PositionType.BOTTOM, 1, 1)
         self.boot_progress = Gtk.ProgressBar()
         set_margin(self.boot_progress)
@@ -657,26 +847,122 @@ class WereSyncWindow(Gtk.Window):
         self.progress_grid.attach_next_to(self.cancel_btn, self.boot_progress,
                                           Gtk.PositionType.BOTTOM, 1, 1)
 
+    def _add_partition_progresses(self, partitions):
+        """Adds a label and progress bar to the progress grid for each of the
+        passed partitions. Must be run on the main thread."""
+        for val in partitions:
+            copy_label = create_label(_("Copying partition {0}: ").format(val))
+            copy_progress = Gtk.ProgressBar()
+            set_margin(copy_progress)
+            self.copy_grid.attach(copy_label, 1, len(self.copy_progresses),
+                                  1, 1)
+            self.copy_grid.attach_next_to(copy_progress, copy_label,
+                                          Gtk.PositionType.RIGHT, 1, 1)
+            self.copy_progresses[val] = copy_progress
+        self.copy_grid.show_all()
+
+    def _throttle(self, key, update):
+        """Runs ``update`` unless the progress bar identified by ``key`` was
+        updated less than :py:data:`PROGRESS_UPDATE_INTERVAL` ago. In that
+        case only the latest ``update`` is kept, and it is run once the
+        interval is over, so the end of a burst is still shown."""
+        now = GLib.get_monotonic_time()
+        wait = self._last_update.get(key, 0) + PROGRESS_UPDATE_INTERVAL - now
+        if wait <= 0:
+            self._last_update[key] = now
+            update()
+            return
+        if key not in self._deferred:
+            GLib.timeout_add(wait // 1000 + 1, self._run_deferred, key)
+        self._deferred[key] = update
+
+    def _run_deferred(self, key):
+        """Runs the update :py:meth:`_throttle` held back for ``key``, unless
+        a final value was shown in the meantime."""
+        update = self._deferred.pop(key, None)
+        if update is not None:
+            self._last_update[key] = GLib.get_monotonic_time()
+            update()
+        return False
+
+    def _schedule_progress(self):
+        """Schedules :py:meth:`_apply_progress` unless it is already pending.
+        Must be called with ``_pending_lock`` held."""
+        if not self._progress_scheduled:
+            self._progress_scheduled = True
+            GLib.idle_add(self._apply_progress)
+
+    def _apply_progress(self):
+        """Applies the latest queued progress values on the main loop."""
+        with self._pending_lock:
+            part_progress = self._pending_part
+            copy_progress = self._pending_copy
+            self._pending_part = None
+            self._pending_copy = {}
+            self._progress_scheduled = False
+        if part_progress is not None:
+            self.part_callback(part_progress)
+        for part, progress in copy_progress.items():
+            self._copy_progress(part, progress)
+        return False
+
+    def queue_part_progress(self, progress):
+        """Receives partitioning progress from the dbus thread. Only the latest
+        value is kept until the main loop gets to it."""
+        with self._pending_lock:
+            self._pending_part = progress
+            self._schedule_progress()
+
     def part_callback(self, progress):
         LOGGER.debug("part callback. Value: {0}".format(progress))
+        if 0 < progress < 1:
+            self._throttle("part",
+                           lambda: self.part_progress.set_fraction(progress))
+            return
+        self._deferred.pop("part", None)
         self.part_progress.set_fraction(progress)
 
     def copy_callback(self, part, progress):
+        """Receives copy progress from the dbus thread and schedules the
+        matching handler on the main loop, so the main loop does not have to
+        work out what kind of update it is."""
         part = str(int(part))
-        if progress < 0:
-            LOGGER.debug(
-                "Error occurred copying partition {0}. Marking complete.".
-                format(part))
-            self.copy_progresses[part].set_fraction(1.0)
-        elif progress is True and isinstance(progress, bool):
-            self.copy_progresses[part].pulse()
-        elif (progress >= self.copy_progresses[part].get_fraction()):
-            self.copy_progresses[part].set_fraction(progress)
+        # Booleans are ints, so they must be checked before the numeric tests
+        if isinstance(progress, bool):
+            if progress:
+                GLib.idle_add(self._copy_pulse, part)
+        elif progress < 0:
+            GLib.idle_add(self._copy_error, part)
+        else:
+            with self._pending_lock:
+                self._pending_copy[part] = progress
+                self._schedule_progress()
+
+    def _copy_pulse(self, part):
+        self._throttle(part, self.copy_progresses[part].pulse)
+
+    def _copy_error(self, part):
+        LOGGER.debug(
+            "Error occurred copying partition {0}. Marking complete.".format(
+                part))
+        self._deferred.pop(part, None)
+        self.copy_progresses[part].set_fraction(1.0)
+
+    def _copy_progress(self, part, progress):
+        bar = self.copy_progresses[part]
+        if progress < bar.get_fraction():
+            return
+        if progress < 1:
+            self._throttle(part, lambda: bar.set_fraction(progress))
+            return
+        self._deferred.pop(part, None)
+        bar.set_fraction(progress)
 
     def boot_callback(self, done):
         if not done:
-            self.boot_progress.pulse()
+            self._throttle("boot", self.boot_progress.pulse)
         else:
+            self._deferred.pop("boot", None)
             self.boot_progress.set_fraction(1.0)
 
 
@@ -684,23 +970,9 @@ def start_gui():
 
     utils.enable_localization()
 
-    try:
-        utils.check_python_version()
-    except InvalidVersionError as ex:
-        print(ex)
-        # This might not work, if the user doesn't have a setup that support
-        # PyGObject, but it's worth a shot.
-        dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.ERROR,
-                                   Gtk.ButtonsType.OK,
-                                   _("Error starting WereSync."))
-        dialog.format_secondary_text(str(ex))
-        dialog.run()
-        dialog.destroy()
-        sys.exit(1)
-
     utils.start_logging_handler(utils.DEFAULT_USER_LOG_LOCATION)
 
-    if not connected:
+    if not dbus_client.get_copy_drive():
         dialog = Gtk.MessageDialog(None, 0, Gtk.MessageType.ERROR,
                                    Gtk.ButtonsType.OK,
                                    _("Error starting WereSync."))
@@ -710,7 +982,6 @@ def start_gui():
         sys.exit(1)
 
     LOGGER.info(_("Starting gui."))
-    GObject.threads_init()
     win = WereSyncWindow()
     win.connect("delete-event", Gtk.main_quit)
     # This is set to expanded so it will be centered as if advanced options
@@ -718,7 +989,7 @@ def start_gui():
     win.set_expander(True)
     win.set_position(Gtk.WindowPosition.CENTER)
     win.show_all()
-    # Then advanced options are closed so as not to be distracting
+    # Then advanced options are closed so as not to be distracting. Their
+    # widgets are already shown, so this needs no second show_all.
     win.set_expander(False)
-    win.show_all()
     Gtk.main()
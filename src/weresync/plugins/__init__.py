@@ -29,6 +29,14 @@ from yapsy.IPlugin import IPlugin
 from distutils.sysconfig import get_python_lib
 import os
 import os.path
+import codecs
+import concurrent.futures
+import contextlib
+import functools
+import mmap
+import re
+import tempfile
+import threading
 import weresync.daemon.device as device
 from weresync.exception import DeviceError
 import sys
@@ -37,10 +45,172 @@ import logging
 LOGGER = logging.getLogger(__name__)
 
 
+TRANSLATE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+"""The number of threads :py:func:`translate_uuid` rewrites files with."""
+MAX_TRANSLATE_FILE_SIZE = 200 * 1024 * 1024
+"""The size in bytes above which :py:func:`translate_uuid` skips a file."""
+
+
+def _find_small_files(root):
+    """Yields the path of every file under ``root`` that is at most
+    :py:data:`MAX_TRANSLATE_FILE_SIZE` bytes. Larger files are skipped since
+    they are unlikely to be config files like we are looking for.
+
+    Symlinks are not followed, so no file is handed out twice, and the size
+    comes from the stat :py:func:`os.scandir` already did. Each directory is
+    gone through in inode order, which is close to on-disk order and saves
+    seeking on spinning disks."""
+    try:
+        with os.scandir(root) as it:
+            entries = sorted(it, key=lambda entry: entry.inode())
+    except OSError:
+        # Same as os.walk, unreadable directories are skipped
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _find_small_files(entry.path)
+            elif (entry.is_file(follow_symlinks=False)
+                    and entry.stat(follow_symlinks=False).st_size
+                    <= MAX_TRANSLATE_FILE_SIZE):
+                yield entry.path
+        except OSError:
+            continue
+
+
+BINARY_PROBE_SIZE = 4096
+"""How many bytes at the start of a file are checked to see if it is binary.
+"""
+
+
+def _is_binary(head):
+    """Returns True if ``head``, the start of a file, shows the file is not
+    UTF-8 text. Text files do not contain NUL bytes, while most binary formats
+    have one early on."""
+    if b"\0" in head:
+        return True
+    try:
+        # An incremental decoder allows a character cut off at the end
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def _is_utf8(buffer):
+    """Returns True if ``buffer`` holds valid UTF-8. It is decoded a MiB at a
+    time, so a large file is never copied or decoded in one piece."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunk = 1024 * 1024
+    try:
+        for start in range(0, len(buffer), chunk):
+            decoder.decode(buffer[start:start + chunk])
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+@contextlib.contextmanager
+def _open_once(fpath, mode="rb"):
+    """Opens the file at ``fpath`` with ``mode``, and tells the kernel it will
+    be read sequentially and not needed again afterwards, so boot files do
+    not push the rest of the page cache out."""
+    with open(fpath, mode) as file:
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        try:
+            yield file
+        finally:
+            file.flush()
+            os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def _rewrite_uuids(fpath, uuid_dict):
+    """Replaces the source uuids in the file at ``fpath`` with the target
+    uuids. Files which are not text are left alone, and the file is only
+    opened for writing if something changed, so files on read-only mounts
+    can still be searched.
+
+    The file is kept as bytes throughout, and only checked to be valid UTF-8
+    once it is known to contain a uuid. Binary files are recognised from
+    their first few KiB, see :py:func:`_is_binary`.
+
+    :param uuid_dict: the uuid mapping, with bytes keys and values."""
+    with _open_once(fpath) as file:
+        raw = file.read(BINARY_PROBE_SIZE)
+        if _is_binary(raw):
+            return
+        raw += file.read()
+    if not any(uuid in raw for uuid in uuid_dict) or not _is_utf8(raw):
+        return
+
+    new_raw = device.multireplace(raw, uuid_dict)
+    if new_raw != raw:
+        with _open_once(fpath, "r+b") as file:
+            file.write(new_raw)
+            file.truncate()
+
+
+def _rewrite_uuids_in_place(fpath, uuid_dict, uuid_regex):
+    """Does the same as :py:func:`_rewrite_uuids`, but edits the file through
+    a memory map. This only works when every replacement has the same length
+    as the uuid it replaces, but then only the changed pages are written back
+    and files without any uuid are never decoded or copied.
+
+    :param uuid_dict: the uuid mapping, with bytes keys and values.
+    :param uuid_regex: a compiled bytes regex matching any key of
+                       ``uuid_dict``, longest first."""
+    with _open_once(fpath) as file:
+        try:
+            mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty and special files cannot be mapped, and contain nothing
+            # to replace anyway.
+            return
+        with mm:
+            if _is_binary(mm[:BINARY_PROBE_SIZE]):
+                return
+            # Only offsets are kept, as a match object holds on to the map
+            # and would stop it from being closed.
+            replacements = [(match.start(), uuid_dict[match.group(0)])
+                            for match in uuid_regex.finditer(mm)]
+            if not replacements or not _is_utf8(mm):
+                return
+
+    with _open_once(fpath, "r+b") as file:
+        with mmap.mmap(file.fileno(), 0) as mm:
+            for start, uuid in replacements:
+                mm[start:start + len(uuid)] = uuid
+
+
+def uuid_rewriter(uuid_dict):
+    """Returns a function which replaces the source uuids in the file at the
+    path it is passed with the target uuids. Only text files are changed.
+
+    If every target uuid is as long as its source uuid, as it is for uuids of
+    the same type, the file is edited in place through a memory map.
+
+    :param uuid_dict: the dictionary from
+                      :py:func:`~weresync.daemon.device.DeviceCopier.get_uuid_dict`.
+    :returns: a function taking the path of the file to change."""
+    byte_dict = {
+        key.encode("utf-8"): val.encode("utf-8")
+        for key, val in uuid_dict.items()
+    }
+    if byte_dict and all(len(key) == len(val)
+                         for key, val in byte_dict.items()):
+        # The same regex device.multireplace uses, longest uuids first
+        uuid_regex = device._replacement_regex(tuple(sorted(byte_dict)))
+        return functools.partial(_rewrite_uuids_in_place,
+                                 uuid_dict=byte_dict,
+                                 uuid_regex=uuid_regex)
+    return functools.partial(_rewrite_uuids, uuid_dict=byte_dict)
+
+
 def translate_uuid(copier, partition, path, target_mnt):
     """Translates all uuids of the files in the given partition at path.
         This will not affect files which are not UTF-8 or ASCII, and it will
-        not affect files which are greater than 200 MB.
+        not affect files which are greater than 200 MiB.
 
         :param copier: the object with the DeviceManager instances.
         :param partition: the partition number of the partition to translate.
@@ -57,25 +227,18 @@ def translate_uuid(copier, partition, path, target_mnt):
             mount_point = target_mnt
             mounted_here = True
 
-        for dname, dirs, files in os.walk(mount_point + path):
-            for fname in files:
-                # This if block seeks to avoid opening huge files since
-                # they are unlikely to be config files like we are looking
-                # for.
-                fpath = os.path.join(dname, fname)
-                if (os.path.getsize(fpath)) / 1000000 > 200:
-                    continue
-
-                try:
-                    with open(fpath) as file:
-                        text = file.read()
-                except UnicodeDecodeError as ex:
-                    continue
-
-                uuid_dict = copier.get_uuid_dict()
-                text = device.multireplace(text, uuid_dict)
-                with open(fpath, "w") as f:
-                    f.write(text)
+        # Neither drive's partitions change during the walk, so the uuid
+        # mapping is looked up once and shared by every file.
+        uuid_dict = copier.get_uuid_dict()
+        if not uuid_dict:
+            return
+        rewrite = uuid_rewriter(uuid_dict)
+        # The work is mostly waiting on file reads and writes, so several
+        # files are handled at once. list() re-raises any worker error.
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=TRANSLATE_WORKERS) as executor:
+            list(executor.map(rewrite,
+                              _find_small_files(mount_point + path)))
     finally:
         if mounted_here:
             copier.target.unmount_partition(partition)
@@ -103,6 +266,44 @@ def mount_partition(manager, lvm_manager, part, mount_point):
     lvm_manager.mount_partition(part, mount_point)
 
 
+def _probe_for_folder(target_mnt, target_manager, partition,
+                      search_folder, mount_point):
+    """Checks if the passed partition contains a search_folder or
+    boot/search_folder directory. If the partition is not mounted it is
+    mounted in a new folder inside target_mnt, and unmounted again
+    afterwards.
+
+    :param mount_point: where the partition is already mounted, or None.
+    :returns: True if the folder was found, False otherwise."""
+    i = partition
+    probe_mnt = None
+    mounted_here = False
+    try:
+        if mount_point is None:
+            probe_mnt = tempfile.mkdtemp(prefix="weresync-probe-",
+                                         dir=target_mnt)
+            target_manager.mount_partition(i, probe_mnt)
+            mount_point = probe_mnt
+            mounted_here = True
+        return (os.path.isdir(os.path.join(mount_point, "boot", search_folder))
+                or os.path.isdir(os.path.join(mount_point, search_folder)))
+    except DeviceError as ex:
+        LOGGER.warning("Could not mount partition {0}. "
+                       "Assumed to not be the partition grub "
+                       "is on.".format(i))
+        LOGGER.debug("Error info:\n", exc_info=sys.exc_info())
+        return False
+    finally:
+        try:
+            if mounted_here:
+                target_manager.unmount_partition(i)
+            if probe_mnt is not None:
+                os.rmdir(probe_mnt)
+        except (DeviceError, OSError) as ex:
+            LOGGER.warning("Error unmounting partition {0}".format(i))
+            LOGGER.debug("Error info:\n", exc_info=sys.exc_info())
+
+
 def search_for_boot_part(
         target_mnt,
         target_manager,
@@ -119,34 +320,28 @@ def search_for_boot_part(
         :param search_folder: The name of the folder to search for
         :param excluded_partitions: A list containing a list of partitions
                                     which should not be searched."""
-    for i in target_manager.get_partitions():
-        if i in exlcuded_partitions:
-            continue
-        try:
-            mounted_here = False
-            mount_point = target_manager.mount_point(i)
-            if mount_point is None:
-                target_manager.mount_partition(i, target_mnt)
-                mount_point = target_mnt
-                mounted_here = True
-            mount_point += "/" if not mount_point.endswith("/") else ""
-            if (os.path.exists(mount_point + "boot/" + search_folder)
-                    or os.path.exists(mount_point + search_folder)):
-                return i
-        except DeviceError as ex:
-            LOGGER.warning("Could not mount partition {0}. "
-                           "Assumed to not be the partition grub "
-                           "is on.".format(i))
-            LOGGER.debug("Error info:\n", exc_info=sys.exc_info())
-        finally:
-            try:
-                if mounted_here:
-                    target_manager.unmount_partition(i)
-            except DeviceError as ex:
-                LOGGER.warning("Error unmounting partition " + i)
-                LOGGER.debug("Error info:\n", exc_info=sys.exc_info())
-    else:  # No partition found
+    partitions = [i for i in target_manager.get_partitions()
+                  if i not in exlcuded_partitions]
+    if not partitions:
         return None
+    mounts = target_manager.mount_points(partitions)
+    # Mounting can be slow, so several partitions are probed at once, each in
+    # its own folder. The results are still checked in partition order so
+    # the same partition is returned as when they were probed one by one.
+    # The pool is capped so probes not yet started can be cancelled once a
+    # match is found.
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(partitions), os.cpu_count() or 1)) as executor:
+        probes = [(i, executor.submit(_probe_for_folder, target_mnt,
+                                      target_manager, i, search_folder,
+                                      mounts.get(i)))
+                  for i in partitions]
+        for i, probe in probes:
+            if probe.result():
+                for _, pending in probes:
+                    pending.cancel()
+                return i
+    return None
 
 
 class IBootPlugin(IPlugin):
@@ -226,8 +421,24 @@ dirs = [
     get_python_lib()
 ]
 
-regex_analyzer = PluginFileAnalyzerMathingRegex("regex", "^weresync_.*\.py$")
+
+class _CompiledRegexAnalyzer(PluginFileAnalyzerMathingRegex):
+    """A PluginFileAnalyzerMathingRegex which compiles its regex once, instead
+    of on every file it checks."""
+
+    def __init__(self, name, regexp):
+        super().__init__(name, regexp)
+        self._compiled = re.compile(regexp)
+
+    def isValidPlugin(self, filename):
+        return self._compiled.match(filename) is not None
+
+
+regex_analyzer = _CompiledRegexAnalyzer("regex", r"^weresync_.*\.py$")
 locator = PluginFileLocator([regex_analyzer])
+# Plugins sit directly in these folders. Walking into subfolders would mean
+# walking every installed package in site-packages.
+locator.disableRecursiveScan()
 
 __manager = PluginManager(
     categories_filter={"bootloader": IBootPlugin},
@@ -238,3 +449,37 @@ __manager = PluginManager(
 def get_manager():
     """Returns the PluginManager for this instance of WereSync"""
     return __manager
+
+
+_collected = False
+_collect_lock = threading.Lock()
+
+
+def collect_plugins():
+    """Makes the PluginManager search the plugin directories. The search and
+    imports only happen the first time this is called, after that this does
+    nothing until :py:func:`invalidate_plugin_cache` is called.
+
+    :returns: the PluginManager for this instance of WereSync"""
+    global _collected
+    with _collect_lock:
+        if not _collected:
+            __manager.collectPlugins()
+            _collected = True
+    return __manager
+
+
+def invalidate_plugin_cache():
+    """Makes the next call to :py:func:`collect_plugins` search the plugin
+    directories again."""
+    global _collected
+    with _collect_lock:
+        _collected = False
+
+
+def get_plugin_for_name(name):
+    """Returns the PluginInfo for the bootloader plugin with the passed name.
+
+    :param name: the full name of the plugin, such as "weresync_grub2".
+    :returns: the PluginInfo, or None if no such plugin was found."""
+    return collect_plugins().getPluginByName(name, "bootloader")
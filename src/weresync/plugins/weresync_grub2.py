@@ -16,7 +16,6 @@
 
 from weresync.plugins import IBootPlugin
 import weresync.plugins as plugins
-import weresync.daemon.device as device
 from weresync.exception import CopyError, DeviceError
 import subprocess
 import os
@@ -50,21 +49,29 @@ class GrubPlugin(IBootPlugin):
                                                 root_partition, efi_partition)
             return
 
+        # Set if the search below leaves the root partition mounted
+        root_mounted_here = False
         if root_partition is None and boot_partition is None:
             # This for loop searches for a partition with a /boot/grub folder
             # and it assumes it is the root partition
-                for i in copier.target.get_partitions():
+                partitions = copier.target.get_partitions()
+                mounts = copier.target.mount_points(partitions)
+                for i in partitions:
                     try:
-                        mount_point = copier.target.mount_point(i)
+                        mount_point = mounts.get(i)
                         if mount_point is None:
                             copier.target.mount_partition(i, target_mnt)
                             mount_point = target_mnt
+                            search_mounted = True
+                        else:
+                            search_mounted = False
                         if os.path.exists(mount_point +
                                           ("/" if not mount_point.endswith("/")
                                            else "") + "boot/grub"):
                             root_partition = i
+                            root_mounted_here = search_mounted
                             break
-                        else:
+                        elif search_mounted:
                             copier.target.unmount_partition(i)
                     except DeviceError as ex:
                         LOGGER.warning("Could not mount partition {0}. "
@@ -78,7 +85,7 @@ class GrubPlugin(IBootPlugin):
 
         # These variables are flags that allow the plugin to know if it mounted
         # any partitions and then clean up properly if it did
-        mounted_here = False
+        mounted_here = root_mounted_here
         boot_mounted_here = False
         try:
             if root_partition is not None:
@@ -104,18 +111,10 @@ class GrubPlugin(IBootPlugin):
 
             print(_("Updating Grub"))
             grub_cfg = mount_loc + "boot/grub/grub.cfg"
-            old_perms = os.stat(grub_cfg)[0]
-            try:
-                with open(grub_cfg, "r+") as grubcfg:
-                    cfg = grubcfg.read()
-                    LOGGER.debug("UUID Dicts: " + str(copier.get_uuid_dict()))
-                    final = device.multireplace(cfg, copier.get_uuid_dict())
-                    grubcfg.seek(0)
-                    grubcfg.write(final)
-                    grubcfg.truncate()
-                    grubcfg.flush()
-            finally:
-                os.chmod(grub_cfg, old_perms)
+            # The file is rewritten in place, so its permissions are kept
+            uuid_dict = copier.get_uuid_dict()
+            LOGGER.debug("UUID Dicts: " + str(uuid_dict))
+            plugins.uuid_rewriter(uuid_dict)(grub_cfg)
 
             print(_("Installing Grub"))
             grub_command = ["grub-install",
@@ -26,6 +26,28 @@ from weresync.plugins import IBootPlugin
 import weresync.plugins as plugins
 from weresync.exception import CopyError, DeviceError
 import subprocess
+import os
+
+
+def _write_boot_code(code_file, device, size, error):
+    """Copies the first ``size`` bytes of code_file to the start of device,
+    like ``dd`` with ``count=1`` and without truncating.
+
+    :param code_file: the file containing the boot code, such as mbr.bin.
+    :param device: the device to write the code to.
+    :param size: the most bytes to copy.
+    :param error: the message of the DeviceError raised on failure."""
+    try:
+        with open(code_file, "rb") as code:
+            data = code.read(size)
+        fd = os.open(device, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError as ex:
+        raise DeviceError(device, error, str(ex))
 
 
 class SyslinuxPlugin(IBootPlugin):
@@ -86,18 +108,10 @@ class SyslinuxPlugin(IBootPlugin):
                                     extlinux_output)
                 table_type = copier.target.get_partition_table_type()
                 if table_type == "msdos":
-                    bios_proc = subprocess.Popen(["dd", "bs=440", "count=1",
-                                                  "if={0}usr/lib/syslinux"
-                                                  "/bios/mbr.bin".format(
-                                                      mount_point),
-                                                  "of=" + copier.target.device
-                                                  ], stdout=subprocess.PIPE,
-                                                 stderr=subprocess.STDOUT)
-                    output, error = bios_proc.communicate()
-                    if bios_proc.returncode != 0:
-                        raise DeviceError(copier.target.device,
-                                          "Error installing bios to drive.",
-                                          output)
+                    _write_boot_code(mount_point
+                                     + "usr/lib/syslinux/bios/mbr.bin",
+                                     copier.target.device, 440,
+                                     "Error installing bios to drive.")
                 elif table_type == "gpt":
                     attribute_proc = subprocess.Popen(["sgdisk",
                                                        copier.target.device,
@@ -109,18 +123,10 @@ class SyslinuxPlugin(IBootPlugin):
                         raise DeviceError(copier.target.device,
                                           "Error enabling boot of partition.",
                                           output)
-                    bios_proc = subprocess.Popen(["dd", "conv=notrunc",
-                                                  "count=1", "if={0}usr/lib"
-                                                  "/syslinux/bios/gptmbr.bin".
-                                                  format(mount_point),
-                                                  "of=" + copier.target.device
-                                                  ], stdout=subprocess.PIPE,
-                                                 stderr=subprocess.STDOUT)
-                    b_output, b_error = bios_proc.communicate()
-                    if bios_proc.returncode != 0:
-                        raise DeviceError(copier.target.device,
-                                          "Error install MBR to drive.",
-                                          b_output)
+                    _write_boot_code(mount_point
+                                     + "usr/lib/syslinux/bios/gptmbr.bin",
+                                     copier.target.device, 512,
+                                     "Error install MBR to drive.")
             finally:
                 if mounted_here:
                     copier.target.unmount_partition(root_partition)
@@ -16,13 +16,23 @@
 from weresync.exception import DeviceError, InvalidVersionError
 import subprocess
 import logging
-import logging.handlers
 import os
-import gettext
+import functools
+import atexit
+import queue
 import sys
+import threading
+import time
 
 LOGGER = logging.getLogger(__name__)
 
+if sys.version_info < (3, 6):
+    raise InvalidVersionError(
+        "Python version {0}.{1} not supported. WereSync requires at least "
+        "Python 3.6\n"
+        "Considering installing WereSync with the pip3 command to insure "
+        "it installs with Python3.".format(*sys.version_info))
+
 LANGUAGES = ["en"]
 """Currently translated languages. See `here <translation.html>`_ for more
 information."""
@@ -30,12 +40,18 @@ information."""
 DEFAULT_USER_LOG_LOCATION = os.path.expanduser(
     "~/.local/log/weresync/weresync-user.log")
 """The default location for WereSync's user log files."""
+LOG_BUFFER_CAPACITY = 512
+"""How many log records are collected before they are written to the log
+file."""
+LOG_FLUSH_INTERVAL = 30
+"""The longest time, in seconds, a log record waits in the buffer before it
+is written to the log file."""
 
 
 def run_proc(args,
              target="",
-             error=None,
-             valid_returncodes=[0],
+             error="",
+             valid_returncodes=(0,),
              throw_error=DeviceError):
     """Creates an runs a subprocess with the passed args. and throws an error
     if the valid returncodes do not exist.
@@ -47,8 +63,8 @@ def run_proc(args,
     :param args: the argument list to run. Passed to the first paramter of
                  `subprocess.Popen`
     :param error: the custom error code to display. Optional
-    :param valid_returncodes: the list of return codes which should *not* throw
-                              an error.
+    :param valid_returncodes: the return codes which should *not* throw an
+                              error.
     :param throw_error: the error class to be thrown if there is an error.
                         Defaults to :py:class:`~weresync.exception.DeviceError`
     :returns: the output of the process
@@ -58,8 +74,6 @@ def run_proc(args,
     output, _ = proc.communicate()
     output = str(output, "utf-8")
     if proc.returncode not in valid_returncodes:
-        if error is None:
-            error = ""
         if throw_error == DeviceError:
             raise DeviceError(target, error, output)
         else:
@@ -70,7 +84,15 @@ def run_proc(args,
 def start_logging_handler(log_loc,
                           stream_level=logging.WARNING,
                           file_level=logging.DEBUG):
-    os.makedirs(os.path.dirname(log_loc), exist_ok=True)
+    import logging.handlers
+    log_dir = os.path.dirname(log_loc)
+    try:
+        os.mkdir(log_dir)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        # Only walk up the tree when a parent folder is actually missing.
+        os.makedirs(log_dir, exist_ok=True)
     logger = logging.getLogger()
     logger.setLevel(file_level if file_level < stream_level else stream_level)
     formatter = logging.Formatter(
@@ -79,34 +101,103 @@ def start_logging_handler(log_loc,
     def enableHandler(hand, level, formatter):
         hand.setLevel(level)
         hand.setFormatter(formatter)
-        logger.addHandler(hand)
 
-    handler = logging.handlers.TimedRotatingFileHandler(
+    class DailyFileHandler(logging.handlers.TimedRotatingFileHandler):
+        """Some Python versions stat the log file on every record to check it
+        is a regular file. This only checks once it is time to roll over."""
+
+        def shouldRollover(self, record):
+            return int(time.time()) >= self.rolloverAt
+
+        def doRollover(self):
+            if (os.path.exists(self.baseFilename)
+                    and not os.path.isfile(self.baseFilename)):
+                # Never roll over something like /dev/null
+                self.rolloverAt = self.computeRollover(int(time.time()))
+                return
+            super().doRollover()
+
+    fileHandler = DailyFileHandler(
         log_loc, when="D", interval=1, backupCount=15)
+    fileHandler.setFormatter(formatter)
+    # Records are written to the file in batches. Warnings and errors are
+    # written at once, together with everything logged before them.
+    handler = logging.handlers.MemoryHandler(
+        LOG_BUFFER_CAPACITY, flushLevel=logging.WARNING, target=fileHandler)
     enableHandler(handler, file_level, formatter)
     streamHandler = logging.StreamHandler()
     enableHandler(streamHandler, stream_level, formatter)
+
+    # Logging calls only put the record on a queue. The file and stream are
+    # written to by a separate thread, so copies are not slowed by log I/O.
+    log_queue = queue.Queue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(
+        log_queue, handler, streamHandler, respect_handler_level=True)
+    listener.start()
+
+    def flush_periodically():
+        # Long running processes, like the daemon, may never fill the buffer
+        # and are not guaranteed to run atexit handlers when stopped.
+        while True:
+            time.sleep(LOG_FLUSH_INTERVAL)
+            handler.flush()
+
+    threading.Thread(target=flush_periodically, daemon=True).start()
+    # Writes out any records still queued or buffered when the program exits.
+    # atexit runs these in reverse, so the queue is drained first.
+    atexit.register(handler.close)
+    atexit.register(listener.stop)
     logging.getLogger("yapsy").setLevel(logging.INFO)
 
 
+def _is_partition_name(name, drive):
+    """Returns True if ``name`` is the kernel's name for a partition of
+    ``drive``. Partitions of drives whose name ends in a digit (loop0,
+    nvme0n1, mmcblk0) are separated from the number with a "p", other
+    partitions follow the drive name directly (sda1)."""
+    prefix = drive + "p" if drive[-1].isdigit() else drive
+    return name.startswith(prefix) and name[len(prefix):].isdigit()
+
+
+def parse_proc_partitions(text):
+    """Returns a list of the drives, but not their partitions, listed in the
+    contents of /proc/partitions.
+
+    :param text: the contents of /proc/partitions as a string."""
+    drives = []
+    for line in text.split("\n")[2:]:
+        # Skips the header line and the blank line after it. The device name
+        # is in the fourth column.
+        words = line.split()
+        if len(words) < 4:
+            continue
+        name = words[3]
+        # Partitions are listed after their drive.
+        if any(_is_partition_name(name, x) for x in drives):
+            continue
+        drives.append(name)
+    return ["/dev/" + x for x in drives]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_translation():
+    """Loads the WereSync translation catalog. The catalog is only read from
+    disk on the first call."""
+    import gettext
+    lodir = os.path.dirname(os.path.realpath(__file__)) + "/resources/locale"
+    return gettext.translation("weresync", localedir=lodir,
+                               languages=LANGUAGES)
+
+
 def enable_localization():
     """Activates the `gettext` module to start internalization and enable
     translation."""
     LOGGER.debug("Enabling localization")
-    lodir = os.path.dirname(os.path.realpath(__file__)) + "/resources/locale"
-    es = gettext.translation("weresync", localedir=lodir, languages=LANGUAGES)
-    es.install()
+    _get_translation().install()
 
 
 def check_python_version():
-    """This method tests if the running version of python supports WereSync.
-    If it does not, it raises a InvalidVersionException"""
-    try:
-        assert sys.version_info > (3, 0)
-    except AssertionError:
-        info = sys.version_info
-        raise InvalidVersionError(
-            "Python version {major}.{minor} not supported. WereSync requires "
-            "at least Python 3.0\n"
-            "Considering installing WereSync with the pip3 command to insure "
-            "it installs with Python3.".format(major=info[0], minor=info[1]))
+    """Kept for compatibility. The Python version is checked once, when this
+    module is imported, and raises a InvalidVersionError if it is not
+    supported."""
@@ -0,0 +1,42 @@
+# Copyright 2016 Daniel Manila
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# flake8: noqa
+
+import sys
+import os
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../src/")
+
+import argparse
+import builtins
+import pytest
+import weresync.interface.cli as cli
+
+
+def test_partition_list():
+    assert cli._partition_list("3,1, 2,,3 ") == [1, 2, 3]
+
+
+def test_partition_list_empty():
+    assert cli._partition_list("") == []
+
+
+def test_partition_list_invalid(monkeypatch):
+    # _ is normally installed by utils.enable_localization
+    monkeypatch.setattr(builtins, "_", lambda x: x, raising=False)
+    with pytest.raises(argparse.ArgumentTypeError,
+                       match="comma separated list"):
+        cli._partition_list("1,boot")
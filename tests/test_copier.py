@@ -0,0 +1,105 @@
+# Copyright 2016 Daniel Manila
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# flake8: noqa
+
+import sys
+import os
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../src/")
+
+import pytest
+
+# The copier publishes its signals through pydbus
+copier = pytest.importorskip("weresync.daemon.copier")
+
+PVS_OUTPUT = """  fileserver:/dev/sdb1
+  fileserver:/dev/sdc1
+  :/dev/sdd1
+"""
+
+
+@pytest.fixture
+def run_proc(monkeypatch):
+    """Replaces utils.run_proc in the copier with one that records its
+    arguments and answers pvs with PVS_OUTPUT. The pvs cache starts out
+    empty."""
+    calls = []
+
+    def fake_run_proc(args, *rest, **kargs):
+        calls.append(args)
+        return PVS_OUTPUT if args[0] == "pvs" else ""
+
+    monkeypatch.setattr(copier.utils, "run_proc", fake_run_proc)
+    monkeypatch.setitem(copier._lvm_cache, "pvs", None)
+    monkeypatch.setitem(copier._lvm_cache, "time", 0)
+    return calls
+
+
+class FakeTarget:
+    """Stands in for the DeviceManager of a drive with two LVM
+    partitions."""
+    device = "/dev/sdc"
+    part_mask = "{0}{1}"
+
+    def get_partition_codes(self):
+        return {1: "8E00", 2: "8300", 3: "8e"}
+
+
+def test_get_volume_group_pvs(run_proc):
+    assert copier._get_volume_group_pvs() == {
+        "fileserver": ["/dev/sdb1", "/dev/sdc1"],
+        "": ["/dev/sdd1"]
+    }
+
+
+def test_get_volume_group_pvs_cached(run_proc, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(copier.time, "monotonic", lambda: now[0])
+    copier._get_volume_group_pvs()
+    copier._get_volume_group_pvs()
+    assert len(run_proc) == 1
+
+    now[0] += copier.LVM_CACHE_TTL + 1
+    copier._get_volume_group_pvs()
+    assert len(run_proc) == 2
+
+
+def test_create_new_vg(run_proc):
+    copier.create_new_vg_if_not_exists("source", "/dev/newgroup",
+                                       FakeTarget())
+    assert run_proc[-1] == ["vgcreate", "/dev/newgroup", "/dev/sdc1",
+                            "/dev/sdc3"]
+    # The new group must show up in the next lookup
+    assert copier._lvm_cache["pvs"] is None
+
+
+def test_extend_existing_vg(run_proc):
+    copier.create_new_vg_if_not_exists("source", "/dev/fileserver",
+                                       FakeTarget())
+    # /dev/sdc1 is already part of the group
+    assert run_proc[-1] == ["vgextend", "fileserver", "/dev/sdc3"]
+    assert copier._lvm_cache["pvs"] is None
+
+
+def test_existing_vg_complete(run_proc):
+    class CompleteTarget(FakeTarget):
+        def get_partition_codes(self):
+            return {1: "8e00"}
+
+    copier.create_new_vg_if_not_exists("source", "fileserver",
+                                       CompleteTarget())
+    assert [args[0] for args in run_proc] == ["pvs"]
+    assert copier._lvm_cache["pvs"] is not None
@@ -21,34 +21,149 @@ myPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, myPath + "/../src/")
 
 import pytest
-import unittest.mock as mock
 import weresync.daemon.device as device
 from weresync.exception import DeviceError, UnsupportedDeviceError
 
 
+class FakePopen:
+    """A minimal stand in for a finished Popen object. Calling it, as code
+    under test calls Popen, returns the same finished process."""
+    __slots__ = ("returncode", "stdout", "_output")
+
+    def __init__(self, output, returncode):
+        self._output = output
+        self.returncode = returncode
+        self.stdout = None
+
+    def __call__(self, *args, **kargs):
+        return self
+
+    def communicate(self, *args, **kargs):
+        return (self._output, None)
+
+
 def generateStandardMock(monkeypatch,
                          return_value_output,
                          return_value_error,
                          return_code,
                          type="gpt"):
     """Generates a mock for the Popen class that allows easy testing of device methods that use Popen."""
-    mock_popen = mock.MagicMock()
     if return_value_error != None:
         return_value_output += return_value_error  # Simulates combining the stdout and stderr
-    mock_popen.communicate.return_value = (return_value_output, None)
-    mock_popen.returncode = return_code
-
-    def popen_constructor(*args, **kargs):
-        return mock_popen
+    mock_popen = FakePopen(return_value_output, return_code)
 
     def mock_table_type(*args, **kargs):
         return type
 
-    monkeypatch.setattr("subprocess.Popen", popen_constructor)
+    monkeypatch.setattr(device.subprocess, "Popen", mock_popen)
     if type != None:
-        monkeypatch.setattr(
-            "weresync.daemon.device.DeviceManager.get_partition_table_type",
-            mock_table_type)
+        monkeypatch.setattr(device.DeviceManager, "get_partition_table_type",
+                            mock_table_type)
+
+
+FIXTURES = {
+    "sgdisk_nbd0": b"""Disk /dev/nbd0: 16777216 sectors, 8.0 GiB
+Logical sector size: 512 bytes
+Disk identifier (GUID): 13E1C95B-5AC6-412B-930B-8F119760B86E
+Partition table holds up to 128 entries
+First usable sector is 34, last usable sector is 16777182
+Partitions will be aligned on 2048-sector boundaries
+Total free space is 4029 sectors (2.0 MiB)
+
+Number  Start (sector)    End (sector)  Size       Code  Name
+   1          976896        11718655   5.1 GiB     8300
+   2        11718656        14452735   1.3 GiB     8300
+   3        14452736        16775167   1.1 GiB     8200
+   4            2048          976895   476.0 MiB   EF02
+                      """,
+    "sfdisk_sdb": b"""Disk /dev/sdb: 5 GiB, 5368709120 bytes, 10485760 sectors
+Units: sectors of 1 * 512 = 512 bytes
+Sector size (logical/physical): 512 bytes / 512 bytes
+I/O size (minimum/optimal): 512 bytes / 512 bytes
+Disklabel type: dos
+Disk identifier: 0x0ee18f9a
+
+Device     Boot  Start      End  Sectors  Size Id Type
+/dev/sdb1  *      2048   350300   348253  170M 83 Linux
+/dev/sdb2       352347 10485759 10133413  4,9G  5 Extended
+/dev/sdb5       352349 10485759 10133411  4,9G 8e Linux LVM""",
+    "fdisk_loop0_bootable": b"""Disk /dev/loop0: 524 MB, 524288000 bytes
+255 heads, 63 sectors/track, 63 cylinders, total 1024000 sectors
+Units = sectors of 1 * 512 = 512 bytes
+Sector size (logical/physical): 512 bytes / 512 bytes
+I/O size (minimum/optimal): 512 bytes / 512 bytes
+Disk identifier: 0x01517e72
+
+      Device Boot      Start         End      Blocks   Id  System
+/dev/loop0p1 *          2048      411647      204800   83  Linux
+/dev/loop0p2          411648      718847      153600   83  Linux
+/dev/loop0p3 *        718848      819199       50176   83  Linux
+/dev/loop0p4          819200     1023999      102400   83  Linux
+""",
+}
+"""Command output shared between several tests, keyed by the tool and device
+that produced it."""
+
+
+PARSE_CASES = [
+    (b"Nope\nvery\nvery\nbad\ndata", "get_partitions", (), "gpt", []),
+    (b"/dev/sda: gpt partitions 1 2 3 4 5 11 8 9 10 6 7",
+     "get_partition_table_type", (), None, "gpt"),
+    (b"/dev/sda: msdos partitions 1 2 3 4 5 11 8 9 10 6 7",
+     "get_partition_table_type", (), None, "msdos"),
+    (b"192", "get_drive_size", (), "gpt", 192),
+    (b"190", "get_drive_size_bytes", (), "gpt", 190),
+    (b"/dev/sda11     676276220 179697120 496579100  27% /media/Data",
+     "get_partition_used", (5,), "gpt", 179697120),
+    (b"204800", "get_partition_size", (4,), "msdos", 204800),
+    (b"ext4", "get_partition_file_system", (4,), "gpt", "ext4"),
+    (b"", "get_partition_file_system", (4,), "gpt", None),
+    (b"completelyimpossiblefilesystemtype", "get_partition_file_system", (4,),
+     "gpt", None),
+]
+"""DeviceManager calls and the value they should parse out of a successful
+command's output, as
+(output, method name, arguments, partition table type, expected result)."""
+
+
+@pytest.mark.parametrize("output,method,args,table_type,expected",
+                         PARSE_CASES)
+def test_parse_output(monkeypatch, output, method, args, table_type, expected):
+    generateStandardMock(monkeypatch, output, b"", 0, table_type)
+    manager = device.DeviceManager("/dev/sda")
+    assert getattr(manager, method)(*args) == expected
+
+
+ERROR_CASES = [
+    ("get_partitions", (), "gpt", 1),
+    ("mount_point", (5,), "gpt", 2),
+    ("mount_partition", (3, "/mnt"), "gpt", 1),
+    ("unmount_partition", (5,), "gpt", 1),
+    ("get_partition_table_type", (), None, 1),
+    ("get_drive_size", (), "gpt", 1),
+    ("get_drive_size_bytes", (), "gpt", 1),
+    ("get_partition_used", (4,), "gpt", 1),
+    ("get_empty_space", (), "gpt", 1),
+    ("get_partition_size", (1,), "gpt", 1),
+    ("get_partition_size", (3,), "msdos", 1),
+    ("get_partition_alignment", (), "gpt", 1),
+    ("get_partition_alignment", (), "msdos", 1),
+    ("get_partition_file_system", (3,), "gpt", 1),
+    ("get_partition_code", (3,), "gpt", 1),
+    ("get_partition_code", (4,), "msdos", 1),
+]
+"""DeviceManager calls that should raise a DeviceError carrying the command
+output when the command returns a non-zero exit code, as
+(method name, arguments, partition table type, return code)."""
+
+
+@pytest.mark.parametrize("method,args,table_type,return_code", ERROR_CASES)
+def test_non_zero_return_code(monkeypatch, method, args, table_type,
+                              return_code):
+    generateStandardMock(monkeypatch, b"", b"Error.", return_code, table_type)
+    manager = device.DeviceManager("/dev/sda")
+    with pytest.raises(DeviceError, match=r"Error\."):
+        getattr(manager, method)(*args)
 
 
 def test_get_partitions_valid(monkeypatch):
@@ -68,22 +183,6 @@ Number  Start   End     Size    File system     Name  Flags
     assert result == [4, 1, 2, 3]
 
 
-def test_get_partitions_none_zero_returncode(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partitions()
-
-    assert "Error." in str(execinfo.value)
-
-
-def test_get_partitions_no_partitions(monkeypatch):
-    generateStandardMock(monkeypatch, b"Nope\nvery\nvery\nbad\ndata", None, 0)
-    manager = device.DeviceManager("/dev/sda")
-    result = manager.get_partitions()
-    assert result == []
-
-
 def test_mount_point_normal(monkeypatch):
     generateStandardMock(monkeypatch,
                          b"""TARGET      SOURCE     FSTYPE  OPTIONS
@@ -94,18 +193,6 @@ def test_mount_point_normal(monkeypatch):
     assert "/mnt" == result
 
 
-def test_mount_point_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch,
-                         b"""TARGET      SOURCE     FSTYPE  OPTIONS\n
-/mnt /dev/sda11 fuseblk rw,nosuid,nodev,relatime,user_id=0,group_id=0,def\n
-""", b"Error.", 2)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        result = manager.mount_point(5)
-
-    assert "Error." in str(execinfo.value)
-
-
 def test_mount_point_no_mount_point(monkeypatch):
     generateStandardMock(monkeypatch, b"", None,
                          1)  # findmnt returns 1 when there is no mount point
@@ -114,19 +201,22 @@ def test_mount_point_no_mount_point(monkeypatch):
     assert result == None
 
 
-def test_mount_partition(monkeypatch):
-    generateStandardMock(monkeypatch, b"", None, 0)
+def test_mount_points(monkeypatch):
+    generateStandardMock(monkeypatch,
+                         b"""/dev/sda1 /
+/dev/sda3 /mnt/my\\x20drive
+/dev/sdb1 /media/usb
+/dev/sda3[/sub] /mnt/other
+""", None, 0)
     manager = device.DeviceManager("/dev/sda")
-    manager.mount_partition(3, "/mnt")
+    result = manager.mount_points([1, 2, 3])
+    assert result == {1: "/", 3: "/mnt/my drive"}
 
 
-def test_mount_partition_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
+def test_mount_partition(monkeypatch):
+    generateStandardMock(monkeypatch, b"", None, 0)
     manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.mount_partition(3, "/mnt")
-
-    assert "Error." in str(execinfo.value)
+    manager.mount_partition(3, "/mnt")
 
 
 def test_unmount_partition(monkeypatch):
@@ -135,96 +225,23 @@ def test_unmount_partition(monkeypatch):
     manager.unmount_partition(5)
 
 
-def test_unmount_partition_non_zero(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
+def test_get_partition_table_type_cached(monkeypatch):
+    generateStandardMock(monkeypatch, b"""/dev/sda: gpt partitions 1 2""", b"", 0, None)
     manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.unmount_partition(5)
-
-    assert "Error." in str(execinfo.value)
+    assert manager.get_partition_table_type() == "gpt"
+    generateStandardMock(monkeypatch, b"""/dev/sda: msdos partitions 1 2""", b"", 0, None)
+    assert manager.get_partition_table_type() == "gpt"
+    manager.refresh()
+    assert manager.get_partition_table_type() == "msdos"
 
 
-def test_get_partition_table_type_gpt(monkeypatch):
-    generateStandardMock(monkeypatch, b"""/dev/sda: gpt partitions 1 2 3 4 5 11 8 9 10 6 7""", b"", 0, None)
-    manager = device.DeviceManager("/dev/sda")
-    result = manager.get_partition_table_type()
-    assert "gpt" == result
-
-def test_get_partition_table_type_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1, None)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_table_type()
-
-    assert "Error." in str(execinfo.value)
-
-def test_get_partition_table_type_mbr(monkeypatch):
-    generateStandardMock(monkeypatch, b"""/dev/sda: msdos partitions 1 2 3 4 5 11 8 9 10 6 7""", b"", 0, None)
-    manager = device.DeviceManager("mbr.img")
-    result = manager.get_partition_table_type()
-
-    assert result == "msdos"
-
 def test_get_partition_table_type_unsupported(monkeypatch):
     generateStandardMock(monkeypatch, b""" dddd   """, b"", 0, None)
     manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(UnsupportedDeviceError) as execinfo:
+    with pytest.raises(UnsupportedDeviceError,
+                       match=r"Partition table type of /dev/sda not supported"):
         manager.get_partition_table_type()
 
-    assert "Partition table type of /dev/sda not supported" in str(execinfo)
-
-
-def test_get_drive_size(monkeypatch):
-    generateStandardMock(monkeypatch, b"192", b"", 0)
-    manager = device.DeviceManager("/dev/sda")
-    result = manager.get_drive_size()
-    assert 192 == result
-
-
-def test_get_drive_size_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_drive_size()
-
-    assert "Error." in str(execinfo.value)
-
-
-def test_get_drive_size_bytes(monkeypatch):
-    generateStandardMock(monkeypatch, b"190", b"", 0)
-    manager = device.DeviceManager("/dev/sda")
-    result = manager.get_drive_size_bytes()
-
-    assert 190 == result
-
-
-def test_get_drive_size_bytes_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_drive_size()
-
-    assert "Error." in str(execinfo.value)
-
-
-def test_get_partition_used(monkeypatch):
-    generateStandardMock(
-        monkeypatch,
-        b"/dev/sda11     676276220 179697120 496579100  27% /media/Data", b"",
-        0)
-    manager = device.DeviceManager("/dev/sda")
-    result = manager.get_partition_used(5)
-    assert 179697120 == result
-
-
-def test_get_partition_used_non_zero_return(monkeypatch):
-    generateStandardMock(monkeypatch, b"  ", b"Error.", 1)
-    manager = device.DeviceManager("/dev/sda")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_used(4)
-
-    assert "Error." in str(execinfo.value)
-
 
 def test_get_drive_empty_space(monkeypatch):
     generateStandardMock(monkeypatch,
@@ -249,15 +266,6 @@ Number  Start (sector)    End (sector)  Size       Code  Name
     assert result == 34
 
 
-def test_get_empty_space_non_zero_return(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 2)
-    manager = device.DeviceManager("gpt.img")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_empty_space()
-
-    assert "Error." in str(execinfo.value)
-
-
 def test_get_empty_space_mbr(monkeypatch):
     generateStandardMock(monkeypatch, b"""Disk mbr.img: 524 MB, 524288000 bytes
 63 heads, 37 sectors/track, 439 cylinders, total 1024000 sectors
@@ -319,47 +327,19 @@ Number  Start (sector)    End (sector)  Size       Code  Name
    4          972800         1019903   23.0 MiB    8300  Linux filesystem
    5         1019904         1023966   2.0 MiB     8300  Linux filesystem
 """, None, 0)
-    monkeypatch.setattr(
-        "weresync.daemon.device.DeviceManager.get_partition_table_type",
-        lambda x: "gpt")
+    monkeypatch.setattr(device.DeviceManager, "get_partition_table_type",
+                        lambda x: "gpt")
     manager = device.DeviceManager("gpt.img")
     result = manager.get_partition_size(5)
     assert 4062 == result
 
 
-def test_get_partition_size_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 2)
-    manager = device.DeviceManager("gpt.img")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_size(1)
-
-    assert "Error." in str(execinfo)
-
-
-def test_get_partition_size_mbr_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 2, "msdos")
-    manager = device.DeviceManager("mbr.img")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_size(3)
-
-    assert "Error." in str(execinfo)
-
-
-def test_get_partition_size_mbr(monkeypatch):
-    generateStandardMock(monkeypatch, b"204800", b"", 0, "msdos")
-    manager = device.DeviceManager("mbr.img")
-    result = manager.get_partition_size(4)
-    assert result == 204800
-
-
 def test_get_partition_size_unknown_table_type(monkeypatch):
     generateStandardMock(monkeypatch, b"", b"", 0, "blah")
     manager = device.DeviceManager("blah.img")
-    with pytest.raises(ValueError) as execinfo:
+    with pytest.raises(ValueError, match=r"Unsupported"):
         manager.get_partition_size(5)
 
-    assert "Unsupported" in str(execinfo)
-
 
 def test_get_sector_alignment_number(monkeypatch):
     generateStandardMock(monkeypatch,
@@ -380,15 +360,6 @@ Number  Start (sector)    End (sector)  Size       Code  Name
     assert result == 2048
 
 
-def test_get_sector_alignment_number_non_zero_return(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
-    manager = device.DeviceManager("gpt.img")
-    with pytest.raises(DeviceError) as execinfo:
-        result = manager.get_partition_alignment()
-
-    assert "Error." in str(execinfo.value)
-
-
 def test_get_sector_alignment_number_invalid_return(monkeypatch):
     generateStandardMock(monkeypatch, b"No alignment", b"", 0)
     manager = device.DeviceManager("gpt.img")
@@ -413,44 +384,6 @@ Disk identifier: 0x524f0bf8
     assert result == 1
 
 
-def test_get_partition_alignment_msdos_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error msdos", 1, "msdos")
-    manager = device.DeviceManager("msdos.img")
-    with pytest.raises(DeviceError) as exceinfo:
-        result = manager.get_partition_alignment()
-
-
-def test_get_partition_file_system(monkeypatch):
-    generateStandardMock(monkeypatch, b"ext4", b"", 0)
-    manager = device.DeviceManager("gpt.img")
-    result = manager.get_partition_file_system(4)
-    assert result == "ext4"
-
-
-def test_get_partition_file_system_empty_return(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"", 0)
-    manager = device.DeviceManager("gpt.img")
-    result = manager.get_partition_file_system(4)
-    assert result == None
-
-
-def test_get_partition_file_system_unsupported_type(monkeypatch):
-    generateStandardMock(monkeypatch, b"completelyimpossiblefilesystemtype",
-                         b"", 0)
-    manager = device.DeviceManager("gpt.img")
-    result = manager.get_partition_file_system(4)
-    assert result == None
-
-
-def test_get_partition_file_system_non_zero_return(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 1)
-    manager = device.DeviceManager("gpt.img")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_file_system(3)
-
-    assert "Error." in str(execinfo.value)
-
-
 def test_set_partition_file_system_non_zero_return(monkeypatch):
     generateStandardMock(monkeypatch, b"", b"Error.", 1)
     manager = device.DeviceManager("gpt.img")
@@ -463,50 +396,36 @@ def test_set_partition_file_system_non_zero_return(monkeypatch):
 
 def test_partition_code(monkeypatch):
     generateStandardMock(monkeypatch,
-                         b"""Disk /dev/nbd0: 16777216 sectors, 8.0 GiB
-Logical sector size: 512 bytes
-Disk identifier (GUID): 13E1C95B-5AC6-412B-930B-8F119760B86E
-Partition table holds up to 128 entries
-First usable sector is 34, last usable sector is 16777182
-Partitions will be aligned on 2048-sector boundaries
-Total free space is 4029 sectors (2.0 MiB)
-
-Number  Start (sector)    End (sector)  Size       Code  Name
-   1          976896        11718655   5.1 GiB     8300
-   2        11718656        14452735   1.3 GiB     8300
-   3        14452736        16775167   1.1 GiB     8200
-   4            2048          976895   476.0 MiB   EF02
-                      """, b"", 0)
+                         FIXTURES["sgdisk_nbd0"], b"", 0)
     manager = device.DeviceManager("gpt.img")
     result = manager.get_partition_code(3)
     assert "8200" == result
 
 
-def test_get_partition_code_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Error.", 2, "gpt")
-    with pytest.raises(DeviceError) as execinfo:
-        manager = device.DeviceManager("gpt.img")
-        manager.get_partition_code(3)
+def test_get_partition_codes(monkeypatch):
+    generateStandardMock(monkeypatch,
+                         FIXTURES["sgdisk_nbd0"], b"", 0)
+    manager = device.DeviceManager("gpt.img")
+    result = manager.get_partition_codes()
+    assert result == {1: "8300", 2: "8300", 3: "8200", 4: "EF02"}
 
-    assert "Error." in str(execinfo)
 
-def test_get_partition_code_newer_format(monkeypatch):
-    generateStandardMock(monkeypatch, b"""Disk /dev/sdb: 5 GiB, 5368709120 bytes, 10485760 sectors
-Units: sectors of 1 * 512 = 512 bytes
-Sector size (logical/physical): 512 bytes / 512 bytes
-I/O size (minimum/optimal): 512 bytes / 512 bytes
-Disklabel type: dos
-Disk identifier: 0x0ee18f9a
+def test_get_partition_codes_mbr(monkeypatch):
+    generateStandardMock(monkeypatch, FIXTURES["sfdisk_sdb"],
+                         b"", 0, "msdos")
+    manager = device.DeviceManager("/dev/sdb")
+    result = manager.get_partition_codes()
+    assert result == {1: "83", 2: "5", 5: "8e"}
 
-Device     Boot  Start      End  Sectors  Size Id Type
-/dev/sdb1  *      2048   350300   348253  170M 83 Linux
-/dev/sdb2       352347 10485759 10133413  4,9G  5 Extended
-/dev/sdb5       352349 10485759 10133411  4,9G 8e Linux LVM""",
+
+def test_get_partition_code_newer_format(monkeypatch):
+    generateStandardMock(monkeypatch, FIXTURES["sfdisk_sdb"],
                          b"", 0, "msdos")
     manager = device.DeviceManager("/dev/sdb")
     result = manager.get_partition_code(5)
     assert "8e" == result
 
+
 def test_get_partition_code_mbr(monkeypatch):
     generateStandardMock(monkeypatch,
                          b"""Disk /dev/loop0: 524 MB, 524288000 bytes
@@ -530,19 +449,7 @@ Disk identifier: 0x01517e72
 
 def test_get_partition_code_mbr_bootable(monkeypatch):
     generateStandardMock(monkeypatch,
-                         b"""Disk /dev/loop0: 524 MB, 524288000 bytes
-255 heads, 63 sectors/track, 63 cylinders, total 1024000 sectors
-Units = sectors of 1 * 512 = 512 bytes
-Sector size (logical/physical): 512 bytes / 512 bytes
-I/O size (minimum/optimal): 512 bytes / 512 bytes
-Disk identifier: 0x01517e72
-
-      Device Boot      Start         End      Blocks   Id  System
-/dev/loop0p1 *          2048      411647      204800   83  Linux
-/dev/loop0p2          411648      718847      153600   83  Linux
-/dev/loop0p3 *        718848      819199       50176   83  Linux
-/dev/loop0p4          819200     1023999      102400   83  Linux
-""", b"", 0, "msdos")
+                         FIXTURES["fdisk_loop0_bootable"], b"", 0, "msdos")
     manager = device.DeviceManager("/dev/loop0", partition_mask="{0}p{1}")
     result = manager.get_partition_code(3)
 
@@ -551,33 +458,12 @@ Disk identifier: 0x01517e72
 
 def test_get_partition_code_mbr_invalid_value_passed(monkeypatch):
     generateStandardMock(monkeypatch,
-                         b"""Disk /dev/loop0: 524 MB, 524288000 bytes
-255 heads, 63 sectors/track, 63 cylinders, total 1024000 sectors
-Units = sectors of 1 * 512 = 512 bytes
-Sector size (logical/physical): 512 bytes / 512 bytes
-I/O size (minimum/optimal): 512 bytes / 512 bytes
-Disk identifier: 0x01517e72
-
-      Device Boot      Start         End      Blocks   Id  System
-/dev/loop0p1 *          2048      411647      204800   83  Linux
-/dev/loop0p2          411648      718847      153600   83  Linux
-/dev/loop0p3 *        718848      819199       50176   83  Linux
-/dev/loop0p4          819200     1023999      102400   83  Linux
-    """, b"", 0, "msdos")
+                         FIXTURES["fdisk_loop0_bootable"], b"", 0, "msdos")
     with pytest.raises(ValueError) as execinfo:
         manager = device.DeviceManager("/dev/loop0", "{0}p{1}")
         manager.get_partition_code(5)
 
 
-def test_get_partition_code_mbr_non_zero_return_code(monkeypatch):
-    generateStandardMock(monkeypatch, b"", b"Test error.", 2, "msdos")
-    manager = device.DeviceManager("mbr.img")
-    with pytest.raises(DeviceError) as execinfo:
-        manager.get_partition_code(4)
-
-    assert "Test error." in str(execinfo)
-
-
 def test_lvm_get_partitions_standard(monkeypatch):
     generateStandardMock(
         monkeypatch,
@@ -596,11 +482,9 @@ def test_lvm_get_partitions_standard(monkeypatch):
 def test_lvm_get_partitions_bad_return_code(monkeypatch):
     generateStandardMock(monkeypatch, b"Test error.", b"", 1, "lvm")
     manager = device.LVMDeviceManager("/dev/fileserver")
-    with pytest.raises(DeviceError) as execinfo:
+    with pytest.raises(DeviceError, match=r"Test error\."):
         manager.get_partitions()
 
-    assert "Test error." in str(execinfo)
-
 
 def test_lvm_get_drive_size_standard(monkeypatch):
     generateStandardMock(monkeypatch, b"  12566528S", b"", 0, "lvm")
@@ -619,11 +503,9 @@ def test_lvm_get_drive_size_bytes_standard(monkeypatch):
 def test_lvm_get_drive_size_bytes_bad_return_code(monkeypatch):
     generateStandardMock(monkeypatch, b"Test error", b"", 1, "lvm")
     manager = device.LVMDeviceManager("/dev/fileserver")
-    with pytest.raises(DeviceError) as execinfo:
+    with pytest.raises(DeviceError, match=r"Test error"):
         manager.get_drive_size_bytes()
 
-    assert "Test error" in str(execinfo)
-
 
 def test_lvm_get_partition_size(monkeypatch):
     generateStandardMock(
@@ -638,11 +520,9 @@ def test_lvm_get_partition_size(monkeypatch):
 def test_lvm_get_partition_size_bad_return_code(monkeypatch):
     generateStandardMock(monkeypatch, b"Didn't work.", b"", 1, "lvm")
     manager = device.LVMDeviceManager("/dev/fileserver")
-    with pytest.raises(DeviceError) as execinfo:
+    with pytest.raises(DeviceError, match=r"Didn't work\."):
         manager.get_partition_size("media")
 
-    assert "Didn't work." in str(execinfo)
-
 
 def test_lvm_get_partition_code_unsupported():
     manager = device.LVMDeviceManager("/dev/fileserver")
@@ -666,7 +546,57 @@ def test_get_empty_space(monkeypatch):
 def test_get_empty_space_non_zero_return_code(monkeypatch):
     generateStandardMock(monkeypatch, b"Error.", b"", 1, "lvm")
     manager = device.LVMDeviceManager("/dev/fileserver")
-    with pytest.raises(DeviceError) as execinfo:
+    with pytest.raises(DeviceError, match=r"Error\."):
         manager.get_empty_space()
 
-    assert "Error." in str(execinfo)
+
+class FakeRsync:
+    """Stands in for a running rsync process, handing out its output in the
+    chunks given."""
+
+    def __init__(self, chunks):
+        self.stdout = self
+        self.stderr = self
+        self._chunks = list(chunks)
+
+    def __call__(self, *args, **kargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def read1(self, size):
+        return self._chunks.pop(0) if self._chunks else b""
+
+    def read(self):
+        return b""
+
+
+RSYNC_CHUNKS = [
+    b"      1,000  10%    1.00MB/s    0:00:01 (xfr#1, to-chk=9/10)\r"
+    b"      2,000  5",
+    b"0%    2.00MB/s    0:00:00\r",
+    b"sending incremental file list\n"
+    b"      3,000 100%    3.00MB/s    0:00:00 (xfr#3, to-chk=0/10)\n",
+]
+
+
+@pytest.mark.parametrize("interval,expected", [
+    (0, [(1, 0.1), (1, 0.5), (1, 1.0), (1, 1.0)]),
+    # Updates within the interval of the last one are skipped
+    (60, [(1, 0.1), (1, 1.0)]),
+])
+def test_copy_partition_progress(monkeypatch, interval, expected):
+    monkeypatch.setattr(device, "PROGRESS_CALLBACK_INTERVAL", interval)
+    monkeypatch.setattr(device.subprocess, "Popen", FakeRsync(RSYNC_CHUNKS))
+    monkeypatch.setattr(device.DeviceManager, "mount_point",
+                        lambda self, partition: "/mnt/part")
+    copier = device.DeviceCopier("/dev/sda", "/dev/sdb")
+    progress = []
+    copier._copy_partition(copier.source, copier.target, 1, "/mnt/source",
+                           "/mnt/target", ["rsync"],
+                           lambda part, value: progress.append((part, value)))
+    assert progress == expected
@@ -0,0 +1,126 @@
+# Copyright 2016 Daniel Manila
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# flake8: noqa
+
+import sys
+import os
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../src/")
+
+import time
+import pytest
+import weresync.plugins as plugins
+
+SOURCE_UUID = "1c2a4b6e-0d3f-4a5b-8c7d-9e0f1a2b3c4d"
+SAME_LENGTH_UUIDS = {SOURCE_UUID: "5f6e7d8c-9b0a-4c1d-8e2f-3a4b5c6d7e8f"}
+DIFFERENT_LENGTH_UUIDS = {SOURCE_UUID: "A1B2-C3D4"}
+
+
+def write_file(tmp_path, contents):
+    path = tmp_path / "grub.cfg"
+    path.write_bytes(contents)
+    return str(path)
+
+
+def test_uuid_rewriter_same_length_in_place(tmp_path):
+    path = write_file(
+        tmp_path, "search --fs-uuid {0}\nroot=UUID={0}\n".format(
+            SOURCE_UUID).encode("utf-8"))
+    inode = os.stat(path).st_ino
+    rewrite = plugins.uuid_rewriter(SAME_LENGTH_UUIDS)
+    assert rewrite.func is plugins._rewrite_uuids_in_place
+
+    rewrite(path)
+    target = SAME_LENGTH_UUIDS[SOURCE_UUID]
+    with open(path, "rb") as f:
+        assert f.read() == "search --fs-uuid {0}\nroot=UUID={0}\n".format(
+            target).encode("utf-8")
+    assert os.stat(path).st_ino == inode
+
+
+def test_uuid_rewriter_different_length(tmp_path):
+    path = write_file(
+        tmp_path, "root=UUID={0} ro\n".format(SOURCE_UUID).encode("utf-8"))
+    rewrite = plugins.uuid_rewriter(DIFFERENT_LENGTH_UUIDS)
+    assert rewrite.func is plugins._rewrite_uuids
+
+    rewrite(path)
+    with open(path, "rb") as f:
+        assert f.read() == b"root=UUID=A1B2-C3D4 ro\n"
+
+
+@pytest.mark.parametrize("uuid_dict",
+                         [SAME_LENGTH_UUIDS, DIFFERENT_LENGTH_UUIDS])
+@pytest.mark.parametrize("contents", [
+    b"",
+    # Binary files have a NUL byte early on
+    b"\x7fELF\x00\x00" + SOURCE_UUID.encode("utf-8"),
+    # Invalid UTF-8 after the part probed for binary content
+    b"a" * (plugins.BINARY_PROBE_SIZE + 10) + SOURCE_UUID.encode("utf-8") +
+    b"\xff\xfe",
+])
+def test_uuid_rewriter_leaves_file_alone(tmp_path, uuid_dict, contents):
+    path = write_file(tmp_path, contents)
+    plugins.uuid_rewriter(uuid_dict)(path)
+    with open(path, "rb") as f:
+        assert f.read() == contents
+
+
+def test_find_small_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(plugins, "MAX_TRANSLATE_FILE_SIZE", 10)
+    (tmp_path / "boot").mkdir()
+    (tmp_path / "boot" / "grub.cfg").write_bytes(b"small")
+    (tmp_path / "big.img").write_bytes(b"x" * 11)
+    (tmp_path / "link.cfg").symlink_to(tmp_path / "boot" / "grub.cfg")
+    (tmp_path / "linkdir").symlink_to(tmp_path / "boot")
+
+    result = list(plugins._find_small_files(str(tmp_path)))
+    assert result == [str(tmp_path / "boot" / "grub.cfg")]
+
+
+class FakeManager:
+    """Stands in for a DeviceManager whose partitions are not mounted."""
+
+    def get_partitions(self):
+        return [1, 2, 3, 4]
+
+    def mount_points(self, partitions):
+        return {}
+
+
+def test_search_for_boot_part_first_partition_wins(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: 4)
+
+    def probe(target_mnt, manager, partition, search_folder, mount_point):
+        if partition == 2:
+            # The earlier match must win even if it is found last
+            time.sleep(0.05)
+        return partition in (2, 3)
+
+    monkeypatch.setattr(plugins, "_probe_for_folder", probe)
+    assert plugins.search_for_boot_part("/mnt", FakeManager(), "grub",
+                                        []) == 2
+
+
+def test_search_for_boot_part_excluded(monkeypatch):
+    monkeypatch.setattr(
+        plugins, "_probe_for_folder",
+        lambda target_mnt, manager, partition, search_folder, mount_point:
+        partition in (2, 3))
+    assert plugins.search_for_boot_part("/mnt", FakeManager(), "grub",
+                                        [2]) == 3
+    assert plugins.search_for_boot_part("/mnt", FakeManager(), "grub",
+                                        [2, 3]) is None
@@ -0,0 +1,46 @@
+# Copyright 2016 Daniel Manila
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# flake8: noqa
+
+import sys
+import os
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../src/")
+
+import weresync.utils as utils
+
+
+def test_parse_proc_partitions():
+    result = utils.parse_proc_partitions("""major minor  #blocks  name
+
+   7        1     102400 loop1
+   7       10     102400 loop10
+   7       11      51200 loop1p1
+   8        0  976762584 sda
+   8        1     512000 sda1
+   8       11    1024000 sda11
+  65      160  976762584 sdaa
+  65      161     512000 sdaa1
+ 259        0  500107608 nvme0n1
+ 259        1     524288 nvme0n1p1
+ 259        2  499582279 nvme0n1p2
+""")
+    assert result == ["/dev/loop1", "/dev/loop10", "/dev/sda", "/dev/sdaa",
+                      "/dev/nvme0n1"]
+
+
+def test_parse_proc_partitions_empty():
+    assert utils.parse_proc_partitions("major minor  #blocks  name\n\n") == []